@@ -14,8 +14,9 @@
 """Factory for concatenation of input to a single tensor."""
 
 import functools
-from typing import TypeVar
+from typing import Any, NamedTuple, TypeVar
 
+import numpy as np
 import tensorflow as tf
 
 from tensorflow_federated.python.aggregators import factory
@@ -35,20 +36,84 @@ from tensorflow_federated.python.core.templates import measured_process
 _T = TypeVar('_T', bound=factory.AggregationFactory)
 
 
-def _concat_impl(struct):
-  """Flattens each tensor in the structure and concats them into a vector."""
-  flattened_vectors = [tf.reshape(x, [-1]) for x in tf.nest.flatten(struct)]
+class _ConcatPlan(NamedTuple):
+  """The static layout of a structure flattened by `_concat_impl`.
+
+  `sizes` is parallel to the flattened leaves of `original_structure`, holding
+  the number of elements of each leaf in the concatenated vector.
+  """
+
+  original_structure: Any
+  sizes: tuple[int, ...]
+
+
+def _concat_impl(struct, sizes=None):
+  """Flattens each tensor in the structure and concats them into a vector.
+
+  Args:
+    struct: A structure of tensors, or of values convertible to tensors.
+    sizes: An optional sequence parallel to the flattened leaves of `struct`,
+      holding the number of elements of each leaf. If `None`, the sizes are
+      inferred by reshaping each leaf to a vector.
+
+  Returns:
+    A rank-1 tensor holding the flattened leaves of `struct`, in order.
+  """
+  flattened = [tf.convert_to_tensor(x) for x in tf.nest.flatten(struct)]
+  if tf.executing_eagerly() and _can_concat_on_host(flattened):
+    # Outside of a graph, concatenating the host buffers directly avoids
+    # dispatching a separate reshape op for every tensor in the structure.
+    return tf.constant(np.concatenate([np.ravel(x) for x in flattened]))
+  if sizes is None:
+    sizes = [-1] * len(flattened)
+  # Rank-1 tensors are already vectors and are passed to `tf.concat` directly.
+  flattened_vectors = [
+      x if x.shape.rank == 1 else tf.reshape(x, [s])
+      for x, s in zip(flattened, sizes)
+  ]
   return tf.concat(flattened_vectors, axis=0)
 
 
-def _unconcat_impl(concatenated_tensor, original_structure):
-  """Applies the inverse of `_concat_impl` given the original structure."""
-  start_location, split_tensors = 0, []
-  for original_tensor in tf.nest.flatten(original_structure):
-    length = int(functools.reduce(lambda a, b: a * b, original_tensor.shape, 1))
-    split_vector = concatenated_tensor[start_location : start_location + length]
-    split_tensors.append(tf.reshape(split_vector, original_tensor.shape))
-    start_location += length
+def _can_concat_on_host(flattened) -> bool:
+  """Returns whether the eager leaves `flattened` can be joined with NumPy.
+
+  The leaves must share a dtype, as `np.concatenate` would silently upcast
+  mixed dtypes where `tf.concat` raises, and must already be in host memory,
+  so that reading their buffers does not force a copy from the device.
+  """
+  if not flattened:
+    return False
+  if len({x.dtype for x in flattened}) != 1:
+    return False
+  return all(
+      tf.DeviceSpec.from_string(x.device).device_type == 'CPU'
+      for x in flattened
+  )
+
+
+def _unconcat_impl(concatenated_tensor, original_structure, sizes=None):
+  """Applies the inverse of `_concat_impl` given the original structure.
+
+  Args:
+    concatenated_tensor: A rank-1 tensor, as returned by `_concat_impl`.
+    original_structure: A structure of tensors or `tf.TensorSpec`s with fully
+      defined shapes, giving the structure to unpack `concatenated_tensor` into.
+    sizes: An optional sequence parallel to the flattened leaves of
+      `original_structure`, holding the number of elements of each leaf. If
+      `None`, the sizes are computed from the shapes of the leaves.
+
+  Returns:
+    A structure matching `original_structure`, holding the slices of
+    `concatenated_tensor` reshaped to the shapes of its leaves.
+  """
+  flattened = tf.nest.flatten(original_structure)
+  if sizes is None:
+    sizes = [x.shape.num_elements() for x in flattened]
+  split_vectors = tf.split(concatenated_tensor, sizes, axis=0)
+  split_tensors = [
+      v if x.shape.rank == 1 else tf.reshape(v, x.shape)
+      for v, x in zip(split_vectors, flattened)
+  ]
   return tf.nest.pack_sequence_as(original_structure, split_tensors)
 
 
@@ -72,10 +137,9 @@ def _next_fn_impl(
   )
 
 
-def create_concat_fns(
-    value_type: factory.ValueType,
-) -> tuple[computation_base.Computation, computation_base.Computation]:
-  """Creates the forward and backward flattening/concatenation functions."""
+@functools.lru_cache()
+def _create_concat_plan(value_type: factory.ValueType) -> _ConcatPlan:
+  """Creates the `_ConcatPlan` for structures of type `value_type`."""
   # As the factory alters the tensor specs, we compute the Python structure
   # of the types for the unconcat procedure.
   if isinstance(
@@ -95,13 +159,27 @@ def create_concat_fns(
 
   _check_component_dtypes(value_type)
 
+  sizes = tuple(
+      x.shape.num_elements() for x in tf.nest.flatten(original_structure)
+  )
+  return _ConcatPlan(original_structure, sizes)
+
+
+def create_concat_fns(
+    value_type: factory.ValueType,
+) -> tuple[computation_base.Computation, computation_base.Computation]:
+  """Creates the forward and backward flattening/concatenation functions."""
+  plan = _create_concat_plan(value_type)
+
   @tensorflow_computation.tf_computation(value_type)
   def concat(struct):
-    return _concat_impl(struct)
+    return _concat_impl(struct, plan.sizes)
 
   @tensorflow_computation.tf_computation(concat.type_signature.result)
   def unconcat(concatenated_tensor):
-    return _unconcat_impl(concatenated_tensor, original_structure)
+    return _unconcat_impl(
+        concatenated_tensor, plan.original_structure, plan.sizes
+    )
 
   return concat, unconcat
 
@@ -116,10 +194,11 @@ def _check_component_dtypes(value_type):
         f'dtype. Found dtypes: {component_dtypes}.'
     )
 
-  # Restrict dtypes to integers and floats for now.
+  # Restrict dtypes to integers and floats for now. All components share the
+  # one dtype, so it is checked directly rather than walking `value_type` again.
+  (dtype,) = component_dtypes
   if not (
-      type_analysis.is_structure_of_floats(value_type)
-      or type_analysis.is_structure_of_integers(value_type)
+      np.issubdtype(dtype, np.integer) or np.issubdtype(dtype, np.floating)
   ):
     raise TypeError(
         'Components of `value_type` must all be integers or '
@@ -12,8 +12,6 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
-import collections
-
 from absl.testing import parameterized
 import numpy as np
 import tensorflow as tf
@@ -34,11 +32,51 @@ _test_struct_type_float_mixed = [
     (np.float32, (2,)),
     (np.float32, (3, 3)),
 ]
-_test_struct_type_nested = collections.OrderedDict(
+_test_struct_type_nested = dict(
     a=[np.float32, [(np.float32, (2, 2, 2))]], b=(np.float32, (3, 3))
 )
 
 
+# Each test case is a function returning a `(structure, concatenated_value)`
+# pair, so that the arrays are only allocated by the test that uses them.
+_CONCAT_IMPL_TEST_CASES = [
+    (
+        'scalars',
+        lambda: ([np.int32(0), np.int32(1), np.int32(2)], np.arange(3)),
+    ),
+    ('rank_1_tensor', lambda: (np.arange(10), np.arange(10))),
+    (
+        'rank_3_tensor',
+        lambda: (np.arange(24).reshape(3, 2, 4), np.arange(24)),
+    ),
+    (
+        'rank_1_tensor_list',
+        lambda: ([np.arange(2), np.arange(3)], np.array([0, 1, 0, 1, 2])),
+    ),
+    (
+        'mixed_rank_tensor_list',
+        lambda: ([np.array([[0, 1], [2, 3]]), np.array([4, 5])], np.arange(6)),
+    ),
+    (
+        'nested_tensors',
+        lambda: (
+            (
+                np.array([0]),
+                [
+                    np.array([[1], [2]]),
+                    dict(a=np.array([3]), b=np.array([4, 5])),
+                ],
+            ),
+            np.arange(6),
+        ),
+    ),
+    (
+        'large_rank_1_tensor_list',
+        lambda: ([np.arange(100), np.arange(100, 500)], np.arange(500)),
+    ),
+]
+
+
 def _concat_mean():
   return concat.concat_factory(mean.MeanFactory())
 
@@ -48,14 +86,28 @@ def _concat_sum():
 
 
 def _make_test_struct_nested(value):
-  return collections.OrderedDict(
-      a=[np.array(value, np.float32), [np.ones([2, 2, 2]) * value]],
-      b=np.ones((3, 3)) * value,
+  return dict(
+      a=[np.float32(value), [np.full([2, 2, 2], value, np.float32)]],
+      b=np.full([3, 3], value, np.float32),
+  )
+
+
+def _to_tensor_structure(struct):
+  flattened = tf.nest.flatten(struct)
+  return tf.nest.pack_sequence_as(
+      struct, [tf.convert_to_tensor(x) for x in flattened]
   )
 
 
 class ConcatFactoryComputationTest(tf.test.TestCase, parameterized.TestCase):
 
+  @classmethod
+  def setUpClass(cls):
+    super().setUpClass()
+    # The factories are stateless, so a single instance serves every test.
+    cls._concat_sum_factory = _concat_sum()
+    cls._concat_mean_factory = _concat_mean()
+
   @parameterized.named_parameters(
       ('float', np.float32),
       ('struct_list_int_scalars', [np.int32, np.int32, np.int32]),
@@ -64,7 +116,7 @@ class ConcatFactoryComputationTest(tf.test.TestCase, parameterized.TestCase):
       ('struct_nested', _test_struct_type_nested),
   )
   def test_concat_type_properties_unweighted(self, value_type):
-    factory = _concat_sum()
+    factory = self._concat_sum_factory
     value_type = computation_types.to_type(value_type)
     process = factory.create(value_type)
     self.assertIsInstance(process, aggregation_process.AggregationProcess)
@@ -84,7 +136,7 @@ class ConcatFactoryComputationTest(tf.test.TestCase, parameterized.TestCase):
         (), placements.SERVER
     )
     expected_next_type = computation_types.FunctionType(
-        parameter=collections.OrderedDict(
+        parameter=dict(
             state=server_state_type,
             value=computation_types.FederatedType(
                 value_type, placements.CLIENTS
@@ -109,7 +161,7 @@ class ConcatFactoryComputationTest(tf.test.TestCase, parameterized.TestCase):
       ('struct_value_float64_weight', _test_struct_type_nested, np.float64),
   )
   def test_clip_type_properties_weighted(self, value_type, weight_type):
-    factory = _concat_mean()
+    factory = self._concat_mean_factory
     value_type = computation_types.to_type(value_type)
     weight_type = computation_types.to_type(weight_type)
     process = factory.create(value_type, weight_type)
@@ -117,7 +169,7 @@ class ConcatFactoryComputationTest(tf.test.TestCase, parameterized.TestCase):
 
     # State comes from the inner MeanFactory.
     server_state_type = computation_types.FederatedType(
-        collections.OrderedDict(value_sum_process=(), weight_sum_process=()),
+        dict(value_sum_process=(), weight_sum_process=()),
         placements.SERVER,
     )
 
@@ -130,11 +182,11 @@ class ConcatFactoryComputationTest(tf.test.TestCase, parameterized.TestCase):
 
     # Measurements come from the inner mean factory.
     expected_measurements_type = computation_types.FederatedType(
-        collections.OrderedDict(mean_value=(), mean_weight=()),
+        dict(mean_value=(), mean_weight=()),
         placements.SERVER,
     )
     expected_next_type = computation_types.FunctionType(
-        parameter=collections.OrderedDict(
+        parameter=dict(
             state=server_state_type,
             value=computation_types.FederatedType(
                 value_type, placements.CLIENTS
@@ -162,7 +214,7 @@ class ConcatFactoryComputationTest(tf.test.TestCase, parameterized.TestCase):
       ('string_nested', [np.str_, [np.str_]]),
   )
   def test_raises_on_non_numeric_dtypes(self, value_type):
-    factory = _concat_sum()
+    factory = self._concat_sum_factory
     value_type = computation_types.to_type(value_type)
     with self.assertRaisesRegex(TypeError, 'must all be integers or floats'):
       factory.create(value_type)
@@ -177,7 +229,7 @@ class ConcatFactoryComputationTest(tf.test.TestCase, parameterized.TestCase):
       ('int32_string_list', [np.int32, np.str_]),
   )
   def test_raises_on_mixed_dtypes(self, value_type):
-    factory = _concat_sum()
+    factory = self._concat_sum_factory
     value_type = computation_types.to_type(value_type)
     with self.assertRaisesRegex(TypeError, 'should have the same dtype'):
       factory.create(value_type)
@@ -190,7 +242,7 @@ class ConcatFactoryComputationTest(tf.test.TestCase, parameterized.TestCase):
       ('nested_function', [computation_types.FunctionType(np.int32, np.int32)]),
   )
   def test_raises_on_bad_tff_value_types(self, value_type):
-    factory = _concat_sum()
+    factory = self._concat_sum_factory
     value_type = computation_types.to_type(value_type)
     with self.assertRaisesRegex(TypeError, 'Expected `value_type` to be'):
       factory.create(value_type)
@@ -253,12 +305,8 @@ class ConcatFactoryExecutionTest(tf.test.TestCase, parameterized.TestCase):
         computation_types.to_type(np.float32),
     )
 
-    expected_state = collections.OrderedDict(
-        value_sum_process=(), weight_sum_process=()
-    )
-    expected_measurements = collections.OrderedDict(
-        mean_value=(), mean_weight=()
-    )
+    expected_state = dict(value_sum_process=(), weight_sum_process=())
+    expected_measurements = dict(mean_value=(), mean_weight=())
 
     state = process.initialize()
     self.assertEqual(state, expected_state)
@@ -268,79 +316,25 @@ class ConcatFactoryExecutionTest(tf.test.TestCase, parameterized.TestCase):
     self.assertEqual(output.measurements, expected_measurements)
     self.assertAllClose(output.result, expected_mean)
 
-  @parameterized.named_parameters([
-      ('scalars', [np.int32(0), np.int32(1), np.int32(2)], np.arange(3)),
-      ('rank_1_tensor', np.arange(10), np.arange(10)),
-      ('rank_3_tensor', np.arange(24).reshape(3, 2, 4), np.arange(24)),
-      (
-          'rank_1_tensor_list',
-          [np.arange(2), np.arange(3)],
-          np.array([0, 1, 0, 1, 2]),
-      ),
-      (
-          'mixed_rank_tensor_list',
-          [np.array([[0, 1], [2, 3]]), np.array([4, 5])],
-          np.arange(6),
-      ),
-      (
-          'nested_tensors',
-          (
-              np.array([0]),
-              [
-                  np.array([[1], [2]]),
-                  dict(a=np.array([3]), b=np.array([4, 5])),
-              ],
-          ),
-          np.arange(6),
-      ),
-      (
-          'large_rank_1_tensor_list',
-          [np.arange(100), np.arange(100, 500)],
-          np.arange(500),
-      ),
-  ])
-  def test_concat_impl(self, value, expected_concat_value):
+  @parameterized.named_parameters(_CONCAT_IMPL_TEST_CASES)
+  def test_concat_impl(self, make_test_case):
     """Checks the structure gets flattened/concatenated and packed correctly."""
+    value, expected_concat_value = make_test_case()
     # Need to convert np arrays to tensors first.
-    value = tf.nest.map_structure(tf.constant, value)
+    value = _to_tensor_structure(value)
     concat_value = concat._concat_impl(value)
     self.assertAllEqual(concat_value, expected_concat_value)
 
-  @parameterized.named_parameters([
-      ('scalars', [np.int32(0), np.int32(1), np.int32(2)], np.arange(3)),
-      ('rank_1_tensor', np.arange(10), np.arange(10)),
-      ('rank_3_tensor', np.arange(24).reshape(3, 2, 4), np.arange(24)),
-      (
-          'rank_1_tensor_list',
-          [np.arange(2), np.arange(3)],
-          np.array([0, 1, 0, 1, 2]),
-      ),
-      (
-          'mixed_rank_tensor_list',
-          [np.array([[0, 1], [2, 3]]), np.array([4, 5])],
-          np.arange(6),
-      ),
-      (
-          'nested_tensors',
-          (
-              np.array([0]),
-              [
-                  np.array([[1], [2]]),
-                  dict(a=np.array([3]), b=np.array([4, 5])),
-              ],
-          ),
-          np.arange(6),
-      ),
-      (
-          'large_rank_1_tensor_list',
-          [np.arange(100), np.arange(100, 500)],
-          np.arange(500),
-      ),
-  ])
-  def test_unconcat_impl(self, original_structure, concat_value):
+  def test_concat_impl_with_python_scalars(self):
+    concat_value = concat._concat_impl([1, 2, 3])
+    self.assertAllEqual(concat_value, [1, 2, 3])
+
+  @parameterized.named_parameters(_CONCAT_IMPL_TEST_CASES)
+  def test_unconcat_impl(self, make_test_case):
+    original_structure, concat_value = make_test_case()
     # Need to convert np arrays to tensors first.
-    original_structure = tf.nest.map_structure(tf.constant, original_structure)
-    concat_value = tf.constant(concat_value)
+    original_structure = _to_tensor_structure(original_structure)
+    concat_value = tf.convert_to_tensor(concat_value)
 
     packed_record = concat._unconcat_impl(concat_value, original_structure)
     tf.nest.assert_same_structure(packed_record, original_structure)
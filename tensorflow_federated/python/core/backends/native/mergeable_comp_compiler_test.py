@@ -35,75 +35,56 @@ def _create_test_context():
   )
 
 
-def build_whimsy_computation_with_aggregation_and_after(
-    server_arg_type, clients_arg_type
-):
-  @tensorflow_computation.tf_computation(
-      server_arg_type.member, clients_arg_type.member
-  )
-  def compute_sum(x, y):
-    return x + y
+@tensorflow_computation.tf_computation(np.int32, np.int32)
+def tf_sum_int(x, y):
+  return x + y
+
+
+@tensorflow_computation.tf_computation([np.int32, np.int32])
+def tf_sum_int_pair(x):
+  return x[0] + x[1]
 
+
+def build_whimsy_computation_with_aggregation_and_after():
   @federated_computation.federated_computation(
-      server_arg_type, clients_arg_type
+      computation_types.FederatedType(np.int32, placements.SERVER),
+      computation_types.FederatedType(np.int32, placements.CLIENTS),
   )
   def aggregation_comp(server_arg, client_arg):
     summed_client_value = intrinsics.federated_sum(client_arg)
     return intrinsics.federated_map(
-        compute_sum, (server_arg, summed_client_value)
+        tf_sum_int, (server_arg, summed_client_value)
     )
 
   return aggregation_comp
 
 
-def build_whimsy_computation_with_before_aggregation_work(
-    server_arg_type, clients_arg_type
-):
-  @tensorflow_computation.tf_computation(clients_arg_type.member)
-  def compute_tuple_sum(x):
-    return x[0] + x[1]
-
-  @tensorflow_computation.tf_computation(
-      server_arg_type.member, clients_arg_type.member[0]
-  )
-  def compute_sum(x, y):
-    return x + y
-
+def build_whimsy_computation_with_before_aggregation_work():
   @federated_computation.federated_computation(
-      server_arg_type, clients_arg_type
+      computation_types.FederatedType(np.int32, placements.SERVER),
+      computation_types.FederatedType([np.int32, np.int32], placements.CLIENTS),
   )
   def aggregation_comp(server_arg, client_arg):
-    client_sums = intrinsics.federated_map(compute_tuple_sum, client_arg)
+    client_sums = intrinsics.federated_map(tf_sum_int_pair, client_arg)
     summed_client_value = intrinsics.federated_sum(client_sums)
     return intrinsics.federated_map(
-        compute_sum, (server_arg, summed_client_value)
+        tf_sum_int, (server_arg, summed_client_value)
     )
 
   return aggregation_comp
 
 
-def build_whimsy_computation_with_false_aggregation_dependence(
-    server_arg_type, clients_arg_type
-):
-  @tensorflow_computation.tf_computation(clients_arg_type.member)
-  def compute_tuple_sum(x):
-    return x[0] + x[1]
-
-  @tensorflow_computation.tf_computation(
-      server_arg_type.member, clients_arg_type.member[0]
-  )
-  def compute_sum(x, y):
-    return x + y
-
+def build_whimsy_computation_with_false_aggregation_dependence():
   @federated_computation.federated_computation
   def package_args_as_tuple(x, y):
     return [x, y]
 
   @federated_computation.federated_computation(
-      server_arg_type, clients_arg_type
+      computation_types.FederatedType(np.int32, placements.SERVER),
+      computation_types.FederatedType([np.int32, np.int32], placements.CLIENTS),
   )
   def aggregation_comp(server_arg, client_arg):
-    client_sums = intrinsics.federated_map(compute_tuple_sum, client_arg)
+    client_sums = intrinsics.federated_map(tf_sum_int_pair, client_arg)
     summed_client_value = intrinsics.federated_sum(client_sums)
     broadcast_sum = intrinsics.federated_broadcast(summed_client_value)
     # Adding a function call here requires normalization into CDF before
@@ -111,7 +92,7 @@ def build_whimsy_computation_with_false_aggregation_dependence(
     client_tuple = package_args_as_tuple(client_sums, broadcast_sum)
     summed_client_value = intrinsics.federated_sum(client_tuple[0])
     return intrinsics.federated_map(
-        compute_sum, (server_arg, summed_client_value)
+        tf_sum_int, (server_arg, summed_client_value)
     )
 
   return aggregation_comp
@@ -136,9 +117,12 @@ def server_placed_mult(arg):
 
 class MergeableCompCompilerTest(absltest.TestCase):
 
-  def setUp(self):
-    self._mergeable_comp_context = _create_test_context()
-    super().setUp()
+  @classmethod
+  def setUpClass(cls):
+    super().setUpClass()
+    # Constructing the C++ executor stack is expensive; invoking a computation
+    # leaves no state behind on the context, so it is shared across tests.
+    cls._mergeable_comp_context = _create_test_context()
 
   def _invoke_mergeable_form_on_arg(
       self,
@@ -246,10 +230,7 @@ class MergeableCompCompilerTest(absltest.TestCase):
     self.assertEqual(expected_six, 6)
 
   def test_compiles_computation_with_aggregation_and_after(self):
-    incoming_comp = build_whimsy_computation_with_aggregation_and_after(
-        computation_types.FederatedType(np.int32, placements.SERVER),
-        computation_types.FederatedType(np.int32, placements.CLIENTS),
-    )
+    incoming_comp = build_whimsy_computation_with_aggregation_and_after()
     mergeable_form = mergeable_comp_compiler.compile_to_mergeable_comp_form(
         incoming_comp
     )
@@ -259,26 +240,21 @@ class MergeableCompCompilerTest(absltest.TestCase):
     )
 
   def test_compilation_preserves_semantics_aggregation_and_after(self):
-    incoming_comp = build_whimsy_computation_with_aggregation_and_after(
-        computation_types.FederatedType(np.int32, placements.SERVER),
-        computation_types.FederatedType(np.int32, placements.CLIENTS),
-    )
+    incoming_comp = build_whimsy_computation_with_aggregation_and_after()
     mergeable_form = mergeable_comp_compiler.compile_to_mergeable_comp_form(
         incoming_comp
     )
-    arg = (100, list(range(100)))
+    # Clients-placed values are partitioned by slicing a Python sequence, so
+    # the per-client values are a list of `np.int32` scalars.
+    client_values = np.arange(100, dtype=np.int32)
+    arg = (np.int32(100), list(client_values))
     result = self._invoke_mergeable_form_on_arg(mergeable_form, arg)
     # Expected result is the sum of all the arguments, IE the sum of all
     # integers from 0 to 100, which is 101 * 100 / 2.
     self.assertEqual(result, 101 * 100 / 2)
 
   def test_compiles_computation_with_before_aggregation_work(self):
-    incoming_comp = build_whimsy_computation_with_before_aggregation_work(
-        computation_types.FederatedType(np.int32, placements.SERVER),
-        computation_types.FederatedType(
-            [np.int32, np.int32], placements.CLIENTS
-        ),
-    )
+    incoming_comp = build_whimsy_computation_with_before_aggregation_work()
     mergeable_form = mergeable_comp_compiler.compile_to_mergeable_comp_form(
         incoming_comp
     )
@@ -288,12 +264,7 @@ class MergeableCompCompilerTest(absltest.TestCase):
     )
 
   def test_compiles_computation_with_false_aggregation_dependence(self):
-    incoming_comp = build_whimsy_computation_with_false_aggregation_dependence(
-        computation_types.FederatedType(np.int32, placements.SERVER),
-        computation_types.FederatedType(
-            [np.int32, np.int32], placements.CLIENTS
-        ),
-    )
+    incoming_comp = build_whimsy_computation_with_false_aggregation_dependence()
     mergeable_form = mergeable_comp_compiler.compile_to_mergeable_comp_form(
         incoming_comp
     )
@@ -303,16 +274,12 @@ class MergeableCompCompilerTest(absltest.TestCase):
     )
 
   def test_compilation_preserves_semantics_before_agg_work(self):
-    incoming_comp = build_whimsy_computation_with_before_aggregation_work(
-        computation_types.FederatedType(np.int32, placements.SERVER),
-        computation_types.FederatedType(
-            [np.int32, np.int32], placements.CLIENTS
-        ),
-    )
+    incoming_comp = build_whimsy_computation_with_before_aggregation_work()
     mergeable_form = mergeable_comp_compiler.compile_to_mergeable_comp_form(
         incoming_comp
     )
-    arg = (100, [(x, x) for x in range(100)])
+    client_values = np.arange(100, dtype=np.int32)
+    arg = (np.int32(100), list(zip(client_values, client_values)))
     result = self._invoke_mergeable_form_on_arg(mergeable_form, arg)
     # Expected result is again the sum of all arguments, which in this case is
     # 2 * 99 * 100 / 2 + 100
@@ -14,11 +14,10 @@
 """Utilities for interacting with and manipulating TensorFlow graphs."""
 
 import collections
-from collections.abc import Iterable, Mapping
+from collections.abc import Callable, Iterable, Mapping
 import dataclasses
-import itertools
-import typing
-from typing import Optional
+import functools
+from typing import Optional, Union
 
 import attrs
 import numpy as np
@@ -82,47 +81,52 @@ def stamp_parameter_in_graph(parameter_name, parameter_type, graph):
   if parameter_type is None:
     return (None, None)
   parameter_type = computation_types.tensorflow_to_type(parameter_type)
+  # Enter the graph once for the whole parameter, rather than once per leaf.
+  with graph.as_default():
+    return _stamp_parameter_in_graph(parameter_name, parameter_type)
+
+
+def _stamp_parameter_in_graph(
+    parameter_name: str, parameter_type: computation_types.Type
+) -> tuple[object, pb.TensorFlow.Binding]:
+  """Implements `stamp_parameter_in_graph` in the current default graph."""
   if isinstance(parameter_type, computation_types.TensorType):
-    with graph.as_default():
-      placeholder = tf.compat.v1.placeholder(
-          dtype=parameter_type.dtype,
-          shape=parameter_type.shape,
-          name=parameter_name,
-      )
-      binding = pb.TensorFlow.Binding(
-          tensor=pb.TensorFlow.TensorBinding(tensor_name=placeholder.name)
-      )
-      return (placeholder, binding)
+    placeholder = tf.compat.v1.placeholder(
+        dtype=parameter_type.dtype,
+        shape=parameter_type.shape,
+        name=parameter_name,
+    )
+    binding = pb.TensorFlow.Binding(
+        tensor=pb.TensorFlow.TensorBinding(tensor_name=placeholder.name)
+    )
+    return (placeholder, binding)
   elif isinstance(parameter_type, computation_types.StructType):
     # The parameter_type could be a StructTypeWithPyContainer, however, we
     # ignore that for now. Instead, the proper containers will be inserted at
     # call time by function_utils.wrap_as_zero_or_one_arg_callable.
-    if not parameter_type:
+    if not parameter_type and tf.compat.v1.get_default_graph().version == 0:
       # Stamps whimsy element to "populate" graph, as TensorFlow does not
-      # support empty graphs.
+      # support empty graphs. Graphs that already have ops don't need one; a
+      # graph's version counts the ops added to it, so checking it is O(1).
       whimsy_tensor = tf.no_op()
       del whimsy_tensor  # Unused
     element_name_value_pairs = []
-    element_bindings = []
+    binding = pb.TensorFlow.Binding()
+    # Set the struct explicitly, as it may have no elements.
+    binding.struct.SetInParent()
     for e in structure.iter_elements(parameter_type):
-      e_val, e_binding = stamp_parameter_in_graph(
-          '{}_{}'.format(parameter_name, e[0]), e[1], graph
+      e_val, e_binding = _stamp_parameter_in_graph(
+          '{}_{}'.format(parameter_name, e[0]), e[1]
       )
       element_name_value_pairs.append((e[0], e_val))
-      element_bindings.append(e_binding)
-    return (
-        structure.Struct(element_name_value_pairs),
-        pb.TensorFlow.Binding(
-            struct=pb.TensorFlow.StructBinding(element=element_bindings)
-        ),
-    )
+      binding.struct.element.append(e_binding)
+    return (structure.Struct(element_name_value_pairs), binding)
   elif isinstance(parameter_type, computation_types.SequenceType):
-    with graph.as_default():
-      with tf.device('/device:cpu:0'):
-        variant_tensor = tf.compat.v1.placeholder(tf.variant, shape=[])
-        ds = make_dataset_from_variant_tensor(
-            variant_tensor, parameter_type.element
-        )
+    with tf.device('/device:cpu:0'):
+      variant_tensor = tf.compat.v1.placeholder(tf.variant, shape=[])
+      ds = make_dataset_from_variant_tensor(
+          variant_tensor, parameter_type.element
+      )
     return (
         ds,
         pb.TensorFlow.Binding(
@@ -191,6 +195,58 @@ class UnsupportedGraphResultError(InvalidGraphResultError):
   """Error due to unsupported type in a TF graph result structure."""
 
 
+class _StructCapture:
+  """A partially captured structure in `capture_result_from_graph`.
+
+  The elements are captured in order: `next_value` returns the value of the
+  next element to capture, and `append` records the type and binding it was
+  captured as. Once `done`, `finish` returns the `(type_spec, binding)` tuple
+  for the whole structure.
+  """
+
+  def __init__(
+      self,
+      name_value_pairs: Iterable[tuple[Optional[str], object]],
+      container_type: Optional[type[object]],
+  ):
+    self._name_value_pairs = list(name_value_pairs)
+    self._container_type = container_type
+    self._type_members = []
+    self._binding = pb.TensorFlow.Binding()
+    # Set the struct explicitly, as it may have no elements.
+    self._binding.struct.SetInParent()
+
+  def done(self) -> bool:
+    return len(self._type_members) == len(self._name_value_pairs)
+
+  def next_value(self) -> object:
+    return self._name_value_pairs[len(self._type_members)][1]
+
+  def append(
+      self, type_spec: computation_types.Type, binding: pb.TensorFlow.Binding
+  ) -> None:
+    name = self._name_value_pairs[len(self._type_members)][0]
+    self._type_members.append((name, type_spec) if name else type_spec)
+    self._binding.struct.element.append(binding)
+
+  def finish(self) -> tuple[computation_types.Type, pb.TensorFlow.Binding]:
+    if self._container_type:
+      type_spec = computation_types.StructWithPythonType(
+          self._type_members, container_type=self._container_type
+      )
+    else:
+      type_spec = computation_types.StructType(self._type_members)
+    return type_spec, self._binding
+
+
+# The result of capturing a single value: either its type and binding, or a
+# `_StructCapture` for a structure whose elements are yet to be captured.
+_CapturedValue = Union[
+    tuple[computation_types.Type, pb.TensorFlow.Binding], _StructCapture
+]
+_CaptureFn = Callable[[object, tf.Graph], _CapturedValue]
+
+
 def capture_result_from_graph(
     result: object,
     graph: tf.Graph,
@@ -217,153 +273,206 @@ def capture_result_from_graph(
     UnsupportedGraphResultError: If `result` contains a value which for which
       conversion in to a `tf.Graph` output is not supported.
   """
-
-  def _get_bindings_for_elements(
-      name_value_pairs: Iterable[tuple[str, object]],
-      graph: tf.Graph,
-      container_type: Optional[type[object]],
-  ) -> tuple[computation_types.Type, pb.TensorFlow.Binding]:
-    """Build `(type_spec, binding)` tuple for name value pairs."""
-    element_name_type_binding_triples = [
-        ((k,) + capture_result_from_graph(v, graph))
-        for k, v in name_value_pairs
-    ]
-    type_members = []
-    for e in element_name_type_binding_triples:
-      type_member = (e[0], e[1]) if e[0] else e[1]
-      type_members.append(type_member)
-    if container_type:
-      type_spec = computation_types.StructWithPythonType(
-          type_members, container_type=container_type
-      )
-    else:
-      type_spec = computation_types.StructType(type_members)
-    binding = pb.TensorFlow.Binding(
-        struct=pb.TensorFlow.StructBinding(
-            element=[e[2] for e in element_name_type_binding_triples]
-        )
-    )
-    return type_spec, binding
-
   # TODO: b/113112885 - The emerging extensions for serializing SavedModels may
   # end up introducing similar concepts of bindings, etc., we should look here
   # into the possibility of reusing some of that code when it's available.
-  if isinstance(result, _TENSOR_REPRESENTATION_TYPES):
-    with graph.as_default():
-      result = tf.constant(result)
-  if tf.is_tensor(result):
-    if hasattr(result, 'read_value'):
-      # We have a tf.Variable-like result, get a proper tensor to fetch.
-      with graph.as_default():
-        result = result.read_value()
-    else:
-      # Otherwise we insert an identity. TensorFlow does not allow the same
-      # tensor to appear in both feeds and fetches, which can occur if the
-      # tff.Computation is only performing a selection from a structure.
-      with graph.as_default():
-        result = tf.identity(result)
-    # `tf.is_tensor` returns true for some things that are not actually single
-    # `tf.Tensor`s, including `tf.sparse.SparseTensor`s and `tf.RaggedTensor`s.
-    if isinstance(result, tf.RaggedTensor):
-      name_value_pairs = (
-          ('flat_values', result.flat_values),
-          ('nested_row_splits', result.nested_row_splits),
-      )
-      return _get_bindings_for_elements(
-          name_value_pairs, graph, tf.RaggedTensor
-      )
-    elif isinstance(result, tf.sparse.SparseTensor):
-      name_value_pairs = (
-          ('indices', result.indices),
-          ('values', result.values),
-          ('dense_shape', result.dense_shape),
-      )
-      return _get_bindings_for_elements(
-          name_value_pairs, graph, tf.sparse.SparseTensor
-      )
+
+  # Structures are captured iteratively rather than recursively: `stack` holds
+  # the structures whose elements are still being captured, innermost last.
+  stack = []
+  value = result
+  while True:
+    captured = _capture_value(value, graph)
+    if isinstance(captured, _StructCapture):
+      stack.append(captured)
+    elif not stack:
+      return captured
     else:
-      if result.dtype.base_dtype == tf.string:
-        dtype = np.str_
-      else:
-        dtype = result.dtype.base_dtype.as_numpy_dtype
-      if result.shape.rank is not None:
-        shape = result.shape.as_list()
-      else:
-        shape = None
-      return (
-          computation_types.TensorType(dtype, shape),
-          pb.TensorFlow.Binding(
-              tensor=pb.TensorFlow.TensorBinding(tensor_name=result.name)
-          ),
+      stack[-1].append(*captured)
+    while stack[-1].done():
+      type_spec, binding = stack.pop().finish()
+      if not stack:
+        return type_spec, binding
+      stack[-1].append(type_spec, binding)
+    value = stack[-1].next_value()
+
+
+def _capture_tensor_representation(
+    result: object, graph: tf.Graph
+) -> _CapturedValue:
+  with graph.as_default():
+    result = tf.constant(result)
+  return _capture_tensor(result, graph)
+
+
+def _capture_tensor(result: object, graph: tf.Graph) -> _CapturedValue:
+  """Captures a value for which `tf.is_tensor` is `True`."""
+  if hasattr(result, 'read_value'):
+    # We have a tf.Variable-like result, get a proper tensor to fetch.
+    with graph.as_default():
+      result = result.read_value()
+  else:
+    # Otherwise we insert an identity. TensorFlow does not allow the same
+    # tensor to appear in both feeds and fetches, which can occur if the
+    # tff.Computation is only performing a selection from a structure.
+    with graph.as_default():
+      result = tf.identity(result)
+  # `tf.is_tensor` returns true for some things that are not actually single
+  # `tf.Tensor`s, including `tf.sparse.SparseTensor`s and `tf.RaggedTensor`s.
+  if isinstance(result, tf.RaggedTensor):
+    name_value_pairs = (
+        ('flat_values', result.flat_values),
+        ('nested_row_splits', result.nested_row_splits),
+    )
+    return _StructCapture(name_value_pairs, tf.RaggedTensor)
+  elif isinstance(result, tf.sparse.SparseTensor):
+    name_value_pairs = (
+        ('indices', result.indices),
+        ('values', result.values),
+        ('dense_shape', result.dense_shape),
+    )
+    return _StructCapture(name_value_pairs, tf.sparse.SparseTensor)
+  else:
+    return _tensor_type_and_binding(result)
+
+
+def _tensor_type_and_binding(
+    tensor: tf.Tensor,
+) -> tuple[computation_types.TensorType, pb.TensorFlow.Binding]:
+  """Returns the type of `tensor` and a binding to its name."""
+  if tensor.dtype.base_dtype == tf.string:
+    dtype = np.str_
+  else:
+    dtype = tensor.dtype.base_dtype.as_numpy_dtype
+  if tensor.shape.rank is not None:
+    shape = tensor.shape.as_list()
+  else:
+    shape = None
+  return (
+      computation_types.TensorType(dtype, shape),
+      pb.TensorFlow.Binding(
+          tensor=pb.TensorFlow.TensorBinding(tensor_name=tensor.name)
+      ),
+  )
+
+
+def _capture_named_tuple(result: object, graph: tf.Graph) -> _StructCapture:
+  del graph  # Unused.
+  # Special handling needed for collections.namedtuples since they do not have
+  # anything in the way of a shared base class. Note we don't want to rely on
+  # the fact that collections.namedtuples inherit from 'tuple' because we'd be
+  # failing to retain the information about naming of tuple members.
+  name_value_pairs = zip(result._fields, result)
+  return _StructCapture(name_value_pairs, type(result))
+
+
+def _capture_attrs(result: object, graph: tf.Graph) -> _StructCapture:
+  del graph  # Unused.
+  name_value_pairs = [
+      (f.name, getattr(result, f.name)) for f in attrs.fields(type(result))
+  ]
+  return _StructCapture(name_value_pairs, type(result))
+
+
+def _capture_dataclass(result: object, graph: tf.Graph) -> _StructCapture:
+  del graph  # Unused.
+  name_value_pairs = result.__dict__.copy().items()
+  return _StructCapture(name_value_pairs, type(result))
+
+
+def _capture_struct(
+    result: structure.Struct, graph: tf.Graph
+) -> _StructCapture:
+  del graph  # Unused.
+  return _StructCapture(structure.to_elements(result), None)
+
+
+def _capture_mapping(result: Mapping, graph: tf.Graph) -> _StructCapture:
+  del graph  # Unused.
+  for key in result:
+    if not isinstance(key, str):
+      key_type_str = py_typecheck.type_string(type(key))
+      raise DictionaryKeyMustBeStringError(
+          'Dictionaries returned from TensorFlow graphs must be of type '
+          f'`str`, but found key `{key}` of type `{key_type_str}`.'
       )
+  name_value_pairs = result.items()
+  return _StructCapture(name_value_pairs, type(result))
+
+
+def _capture_sequence(
+    result: Union[list[object], tuple[object, ...]], graph: tf.Graph
+) -> _CapturedValue:
+  """Captures a `list` or `tuple`."""
+  if result and all(isinstance(e, tf.Tensor) for e in result):
+    # A sequence of dense tensors (e.g. model weights) is common enough to
+    # capture directly, adding all of the identities in a single graph context.
+    with graph.as_default():
+      tensors = [tf.identity(e) for e in result]
+    type_members, bindings = zip(
+        *[_tensor_type_and_binding(t) for t in tensors]
+    )
+    binding = pb.TensorFlow.Binding()
+    binding.struct.element.extend(bindings)
+    return (
+        computation_types.StructWithPythonType(type_members, type(result)),
+        binding,
+    )
+  return _StructCapture([(None, e) for e in result], type(result))
+
+
+def _capture_dataset(
+    result: tf.data.Dataset, graph: tf.Graph
+) -> _CapturedValue:
+  """Captures a `tf.data.Dataset` as a sequence."""
+  try:
+    element_type = computation_types.tensorflow_to_type(result.element_spec)
+  except TypeError as e:
+    raise InvalidDatasetElementSpecError(
+        'Dataset has `element_spec` which is not a valid TFF type.\n'
+        f'Found `element_spec`: {result.element_spec}\n'
+        f'which is not a valid TFF type: {str(e)}'
+    ) from None
+
+  # This variant tensor needs an identity added to ensure that parameter and
+  # result bindings in our graphdefs are distinct. A similar operation is
+  # performed in generation of tf.function.
+  # We additionally pin this return dataset to CPU to prevent placer from
+  # attempting to copy the identity operation with dataset input (CPU only) to
+  # GPU.
+  with graph.as_default():
+    with tf.device('/device:cpu:0'):
+      variant_tensor = tf.identity(tf.data.experimental.to_variant(result))
+  return (
+      computation_types.SequenceType(element_type),
+      pb.TensorFlow.Binding(
+          sequence=pb.TensorFlow.SequenceBinding(
+              variant_tensor_name=variant_tensor.name
+          )
+      ),
+  )
+
+
+def _find_capture_fn(result: object) -> _CaptureFn:
+  """Returns the function that captures `result`, based on its type."""
+  if isinstance(result, _TENSOR_REPRESENTATION_TYPES):
+    return _capture_tensor_representation
+  elif tf.is_tensor(result):
+    return _capture_tensor
   elif isinstance(result, py_typecheck.SupportsNamedTuple):
-    # Special handling needed for collections.namedtuples since they do not have
-    # anything in the way of a shared base class. Note we don't want to rely on
-    # the fact that collections.namedtuples inherit from 'tuple' because we'd be
-    # failing to retain the information about naming of tuple members.
-    name_value_pairs = result._asdict().items()
-    return _get_bindings_for_elements(name_value_pairs, graph, type(result))
+    return _capture_named_tuple
   elif attrs.has(type(result)):
-    name_value_pairs = attrs.asdict(result, recurse=False).items()
-    return _get_bindings_for_elements(name_value_pairs, graph, type(result))
+    return _capture_attrs
   elif dataclasses.is_dataclass(result):
-    name_value_pairs = result.__dict__.copy().items()
-    return _get_bindings_for_elements(name_value_pairs, graph, type(result))
+    return _capture_dataclass
   elif isinstance(result, structure.Struct):
-    return _get_bindings_for_elements(
-        structure.to_elements(result), graph, None
-    )
+    return _capture_struct
   elif isinstance(result, Mapping):
-    for key in result:
-      if not isinstance(key, str):
-        key_type_str = py_typecheck.type_string(type(key))
-        raise DictionaryKeyMustBeStringError(
-            'Dictionaries returned from TensorFlow graphs must be of type '
-            f'`str`, but found key `{key}` of type `{key_type_str}`.'
-        )
-    name_value_pairs = result.items()
-    return _get_bindings_for_elements(name_value_pairs, graph, type(result))
+    return _capture_mapping
   elif isinstance(result, (list, tuple)):
-    element_type_binding_pairs = [
-        capture_result_from_graph(e, graph) for e in result
-    ]
-    return (
-        computation_types.StructWithPythonType(
-            [e[0] for e in element_type_binding_pairs], type(result)
-        ),
-        pb.TensorFlow.Binding(
-            struct=pb.TensorFlow.StructBinding(
-                element=[e[1] for e in element_type_binding_pairs]
-            )
-        ),
-    )
+    return _capture_sequence
   elif isinstance(result, tf.data.Dataset):
-    try:
-      element_type = computation_types.tensorflow_to_type(result.element_spec)
-    except TypeError as e:
-      raise InvalidDatasetElementSpecError(
-          'Dataset has `element_spec` which is not a valid TFF type.\n'
-          f'Found `element_spec`: {result.element_spec}\n'
-          f'which is not a valid TFF type: {str(e)}'
-      ) from None
-
-    # This variant tensor needs an identity added to ensure that parameter and
-    # result bindings in our graphdefs are distinct. A similar operation is
-    # performed in generation of tf.function.
-    # We additionally pin this return dataset to CPU to prevent placer from
-    # attempting to copy the identity operation with dataset input (CPU only) to
-    # GPU.
-    with graph.as_default():
-      with tf.device('/device:cpu:0'):
-        variant_tensor = tf.identity(tf.data.experimental.to_variant(result))
-    return (
-        computation_types.SequenceType(element_type),
-        pb.TensorFlow.Binding(
-            sequence=pb.TensorFlow.SequenceBinding(
-                variant_tensor_name=variant_tensor.name
-            )
-        ),
-    )
+    return _capture_dataset
   else:
     result_type_str = py_typecheck.type_string(type(result))
     raise UnsupportedGraphResultError(
@@ -371,6 +480,37 @@ def capture_result_from_graph(
     )
 
 
+# A cache of the function used to capture values of a given Python type, seeded
+# with the most common types. Every check in `_find_capture_fn` depends only on
+# the type of the value, so the result can be reused for other values of the
+# same type. The size is bounded as types may be created dynamically.
+_CAPTURE_FN_BY_TYPE: dict[type[object], _CaptureFn] = {
+    str: _capture_tensor_representation,
+    int: _capture_tensor_representation,
+    float: _capture_tensor_representation,
+    bool: _capture_tensor_representation,
+    bytes: _capture_tensor_representation,
+    np.ndarray: _capture_tensor_representation,
+    list: _capture_sequence,
+    tuple: _capture_sequence,
+    dict: _capture_mapping,
+    collections.OrderedDict: _capture_mapping,
+    structure.Struct: _capture_struct,
+}
+_MAX_CAPTURE_FN_BY_TYPE_SIZE = 1024
+
+
+def _capture_value(result: object, graph: tf.Graph) -> _CapturedValue:
+  """Captures `result`, or returns a `_StructCapture` for its elements."""
+  result_type = type(result)
+  capture_fn = _CAPTURE_FN_BY_TYPE.get(result_type)
+  if capture_fn is None:
+    capture_fn = _find_capture_fn(result)
+    if len(_CAPTURE_FN_BY_TYPE) < _MAX_CAPTURE_FN_BY_TYPE_SIZE:
+      _CAPTURE_FN_BY_TYPE[result_type] = capture_fn
+  return capture_fn(result, graph)
+
+
 def compute_map_from_bindings(source, target):
   """Computes a dictionary for renaming tensors from a matching bindings pair.
 
@@ -391,51 +531,51 @@ def compute_map_from_bindings(source, target):
   """
   py_typecheck.check_type(source, pb.TensorFlow.Binding)
   py_typecheck.check_type(target, pb.TensorFlow.Binding)
-  source_oneof = source.WhichOneof('binding')
-  target_oneof = target.WhichOneof('binding')
-  if source_oneof != target_oneof:
-    raise ValueError(
-        'Source and target binding variants mismatch: {} vs. {}'.format(
-            source_oneof, target_oneof
-        )
-    )
-  if source_oneof == 'tensor':
-    return collections.OrderedDict(
-        [(str(source.tensor.tensor_name), str(target.tensor.tensor_name))]
-    )
-  elif source_oneof == 'sequence':
-    sequence_oneof = source.sequence.WhichOneof('binding')
-    if target.sequence.WhichOneof('binding') != sequence_oneof:
+  result = {}
+  # The bindings are walked depth-first with an explicit stack; struct elements
+  # are pushed in reverse so that they are popped in order.
+  bindings_to_map = [(source, target)]
+  while bindings_to_map:
+    source, target = bindings_to_map.pop()
+    source_oneof = source.WhichOneof('binding')
+    target_oneof = target.WhichOneof('binding')
+    if source_oneof != target_oneof:
       raise ValueError(
-          'Source and target sequence bindings mismatch: {} vs. {}'.format(
-              sequence_oneof, target.sequence.WhichOneof('binding')
+          'Source and target binding variants mismatch: {} vs. {}'.format(
+              source_oneof, target_oneof
           )
       )
-    if sequence_oneof == 'variant_tensor_name':
-      return collections.OrderedDict([
-          (
-              str(source.sequence.variant_tensor_name),
-              str(target.sequence.variant_tensor_name),
-          ),
-      ])
-    else:
-      raise ValueError('Unsupported sequence binding {}'.format(sequence_oneof))
-  elif source_oneof == 'struct':
-    if len(source.struct.element) != len(target.struct.element):
-      raise ValueError(
-          'Source and target binding tuple lengths mismatch: {} vs. {}.'.format(
-              len(source.struct.element), len(target.struct.element)
-          )
+    if source_oneof == 'tensor':
+      result[source.tensor.tensor_name] = target.tensor.tensor_name
+    elif source_oneof == 'sequence':
+      sequence_oneof = source.sequence.WhichOneof('binding')
+      target_sequence_oneof = target.sequence.WhichOneof('binding')
+      if sequence_oneof != target_sequence_oneof:
+        raise ValueError(
+            'Source and target sequence bindings mismatch: {} vs. {}'.format(
+                sequence_oneof, target_sequence_oneof
+            )
+        )
+      if sequence_oneof == 'variant_tensor_name':
+        result[source.sequence.variant_tensor_name] = (
+            target.sequence.variant_tensor_name
+        )
+      else:
+        raise ValueError(
+            'Unsupported sequence binding {}'.format(sequence_oneof)
+        )
+    elif source_oneof == 'struct':
+      if len(source.struct.element) != len(target.struct.element):
+        raise ValueError(
+            'Source and target binding tuple lengths mismatch: {} vs. {}.'
+            .format(len(source.struct.element), len(target.struct.element))
+        )
+      bindings_to_map.extend(
+          reversed(list(zip(source.struct.element, target.struct.element)))
       )
     else:
-      result = collections.OrderedDict()
-      for source_element, target_element in zip(
-          source.struct.element, target.struct.element
-      ):
-        result.update(compute_map_from_bindings(source_element, target_element))
-      return result
-  else:
-    raise ValueError("Unsupported type of binding '{}'.".format(source_oneof))
+      raise ValueError("Unsupported type of binding '{}'.".format(source_oneof))
+  return result
 
 
 def extract_tensor_names_from_binding(binding):
@@ -448,26 +588,30 @@ def extract_tensor_names_from_binding(binding):
     All tensor names that appear in `binding`.
   """
   py_typecheck.check_type(binding, pb.TensorFlow.Binding)
-  binding_oneof = binding.WhichOneof('binding')
-  if binding_oneof == 'tensor':
-    return [str(binding.tensor.tensor_name)]
-  elif binding_oneof == 'sequence':
-    sequence_oneof = binding.sequence.WhichOneof('binding')
-    if sequence_oneof == 'variant_tensor_name':
-      return [str(binding.sequence.variant_tensor_name)]
-    else:
-      raise ValueError('Unsupported sequence binding {}'.format(sequence_oneof))
-  elif binding_oneof == 'struct':
-    return list(
-        itertools.chain.from_iterable(
-            [
-                extract_tensor_names_from_binding(e)
-                for e in binding.struct.element
-            ]
+  tensor_names = []
+  # The binding is walked depth-first with an explicit stack; struct elements
+  # are pushed in reverse so that their names are collected in order.
+  bindings_to_visit = [binding]
+  while bindings_to_visit:
+    binding = bindings_to_visit.pop()
+    binding_oneof = binding.WhichOneof('binding')
+    if binding_oneof == 'tensor':
+      tensor_names.append(binding.tensor.tensor_name)
+    elif binding_oneof == 'sequence':
+      sequence_oneof = binding.sequence.WhichOneof('binding')
+      if sequence_oneof == 'variant_tensor_name':
+        tensor_names.append(binding.sequence.variant_tensor_name)
+      else:
+        raise ValueError(
+            'Unsupported sequence binding {}'.format(sequence_oneof)
         )
-    )
-  else:
-    raise ValueError("Unsupported type of binding '{}'.".format(binding_oneof))
+    elif binding_oneof == 'struct':
+      bindings_to_visit.extend(reversed(binding.struct.element))
+    else:
+      raise ValueError(
+          "Unsupported type of binding '{}'.".format(binding_oneof)
+      )
+  return tensor_names
 
 
 def assemble_result_from_graph(type_spec, binding, output_map):
@@ -507,7 +651,31 @@ def assemble_result_from_graph(type_spec, binding, output_map):
               k, py_typecheck.type_string(type(v))
           )
       )
+  return _assemble_result_from_graph(type_spec, binding, output_map)
+
+
+def _infer_tensor_type(tensor: tf.Tensor) -> computation_types.Type:
+  """Returns the type of `tensor`, as `tensorflow_infer_type` would infer it."""
+  if tensor.shape.rank is None:
+    shape = None
+  else:
+    shape = tuple(tensor.shape.as_list())
+  return _tensor_type_for_dtype_and_shape(tensor.dtype, shape)
 
+
+@functools.lru_cache(maxsize=4096)
+def _tensor_type_for_dtype_and_shape(
+    dtype: tf.dtypes.DType, shape: Optional[tuple[Optional[int], ...]]
+) -> computation_types.Type:
+  return computation_types.tensorflow_to_type((dtype, tf.TensorShape(shape)))
+
+
+def _assemble_result_from_graph(
+    type_spec: computation_types.Type,
+    binding: pb.TensorFlow.Binding,
+    output_map: dict[str, tf.Tensor],
+):
+  """Implements `assemble_result_from_graph` on already validated arguments."""
   binding_oneof = binding.WhichOneof('binding')
   if isinstance(type_spec, computation_types.TensorType):
     if binding_oneof != 'tensor':
@@ -523,7 +691,10 @@ def assemble_result_from_graph(type_spec, binding, output_map):
     else:
       tensor_name = binding.tensor.tensor_name
       tensor = output_map[tensor_name]
-      inferred_type = type_conversions.tensorflow_infer_type(tensor)
+      if isinstance(tensor, tf.Tensor):
+        inferred_type = _infer_tensor_type(tensor)
+      else:
+        inferred_type = type_conversions.tensorflow_infer_type(tensor)
       if not type_spec.is_assignable_from(inferred_type):
         raise ValueError(
             f'Type mismatch loading graph result tensor {tensor} '
@@ -549,7 +720,7 @@ def assemble_result_from_graph(type_spec, binding, output_map):
       for (element_name, element_type), element_binding in zip(
           type_elements, binding.struct.element
       ):
-        element_object = assemble_result_from_graph(
+        element_object = _assemble_result_from_graph(
             element_type, element_binding, output_map
         )
         result_elements.append((element_name, element_object))
@@ -620,6 +791,13 @@ def make_empty_list_structure_for_element_type_spec(type_spec):
   """
   type_spec = computation_types.tensorflow_to_type(type_spec)
   py_typecheck.check_type(type_spec, computation_types.Type)
+  return _make_empty_list_structure_for_element_type_spec(type_spec)
+
+
+def _make_empty_list_structure_for_element_type_spec(
+    type_spec: computation_types.Type,
+):
+  """Implements `make_empty_list_structure_for_element_type_spec`."""
   if isinstance(type_spec, computation_types.TensorType):
     return []
   elif isinstance(type_spec, computation_types.StructType):
@@ -627,14 +805,14 @@ def make_empty_list_structure_for_element_type_spec(type_spec):
     if all(k is not None for k, _ in elements):
       return collections.OrderedDict(
           [
-              (k, make_empty_list_structure_for_element_type_spec(v))
+              (k, _make_empty_list_structure_for_element_type_spec(v))
               for k, v in elements
           ]
       )
     elif all(k is None for k, _ in elements):
       return tuple(
           [
-              make_empty_list_structure_for_element_type_spec(v)
+              _make_empty_list_structure_for_element_type_spec(v)
               for _, v in elements
           ]
       )
@@ -704,17 +882,21 @@ def make_whimsy_element_for_type_spec(type_spec, none_dim_replacement=0):
       return none_dim_replacement
     return x
 
-  if isinstance(type_spec, computation_types.TensorType):
-    whimsy_shape = [_handle_none_dimension(x) for x in type_spec.shape]
-    if type_spec.dtype == np.str_:
-      return np.empty(whimsy_shape, dtype=np.str_)
-    return np.zeros(whimsy_shape, type_spec.dtype)
-  elif isinstance(type_spec, computation_types.StructType):
-    elements = structure.to_elements(type_spec)
-    elem_list = []
-    for _, elem_type in elements:
-      elem_list.append(make_whimsy_element_for_type_spec(elem_type))
-    return elem_list
+  # The type has been validated above, so the recursion below only builds the
+  # arrays and does not re-check (or re-convert) each nested type.
+  def _make_whimsy_element(type_spec):
+    if isinstance(type_spec, computation_types.TensorType):
+      whimsy_shape = [_handle_none_dimension(x) for x in type_spec.shape]
+      if type_spec.dtype == np.str_:
+        return np.empty(whimsy_shape, dtype=np.str_)
+      return np.zeros(whimsy_shape, type_spec.dtype)
+    else:
+      return [
+          _make_whimsy_element(v)
+          for _, v in structure.iter_elements(type_spec)
+      ]
+
+  return _make_whimsy_element(type_spec)
 
 
 def append_to_list_structure_for_element_type_spec(nested, value, type_spec):
@@ -737,80 +919,246 @@ def append_to_list_structure_for_element_type_spec(nested, value, type_spec):
     TypeError: If the `type_spec` is not of a form described above, or the value
       is not of a type compatible with `type_spec`.
   """
-  if value is None:
-    return
   type_spec = computation_types.tensorflow_to_type(type_spec)
+  append = _compile_appender(type_spec)
+  append(_get_leaf_lists(nested, type_spec), value)
+
+
+def _get_leaf_lists(nested, type_spec: computation_types.Type) -> list[list]:
+  """Returns the leaf lists of `nested` in the leaf order of `type_spec`.
+
+  The returned lists are the same objects as those in `nested`, so appending to
+  them also appends to `nested`.
+
+  Args:
+    nested: Output of `make_empty_list_structure_for_element_type_spec`.
+    type_spec: The `computation_types.Type` that `nested` was created for.
+
+  Raises:
+    TypeError: If `nested` does not have the structure created for `type_spec`.
+  """
+  leaf_lists = []
+  nested_to_visit = [(nested, type_spec)]
+  while nested_to_visit:
+    nested, type_spec = nested_to_visit.pop()
+    if isinstance(type_spec, computation_types.TensorType):
+      if not isinstance(nested, list):
+        raise TypeError(
+            f'Expected `nested` to be a `list`, found {type(nested)}'
+        )
+      leaf_lists.append(nested)
+    elif isinstance(type_spec, computation_types.StructType):
+      elements = structure.to_elements(type_spec)
+      if isinstance(nested, collections.OrderedDict):
+        children = [(nested[k], v) for k, v in elements]
+      elif isinstance(nested, tuple):
+        children = [(nested[i], v) for i, (_, v) in enumerate(elements)]
+      else:
+        raise TypeError(
+            'Invalid nested structure, unexpected container type {}.'.format(
+                py_typecheck.type_string(type(nested))
+            )
+        )
+      # Pushed in reverse, so that the leaves are visited in order.
+      nested_to_visit.extend(reversed(children))
+    else:
+      raise TypeError(
+          'Expected a tensor or named tuple type, found {}.'.format(type_spec)
+      )
+  return leaf_lists
+
+
+_Appender = Callable[[list[list], object], None]
+
+
+def _struct_to_container(value: structure.Struct) -> Union[dict, tuple]:
   # TODO: b/113116813 - This could be made more efficient, but for now we won't
   # need to worry about it as this is an odd corner case.
-  if isinstance(value, structure.Struct):
-    elements = structure.to_elements(value)
-    if all(k is not None for k, _ in elements):
-      value = collections.OrderedDict(elements)
-    elif all(k is None for k, _ in elements):
-      value = tuple([v for _, v in elements])
-    else:
+  elements = structure.to_elements(value)
+  if all(k is not None for k, _ in elements):
+    return collections.OrderedDict(elements)
+  elif all(k is None for k, _ in elements):
+    return tuple([v for _, v in elements])
+  else:
+    raise TypeError(
+        'Expected an anonymous tuple to either have all elements named or '
+        'all unnamed, got {}.'.format(value)
+    )
+
+
+@functools.lru_cache()
+def _compile_appender(type_spec: computation_types.Type) -> _Appender:
+  """Returns a function that appends the leaves of a value to leaf lists.
+
+  The type is walked once, here, and each tensor leaf is assigned the index of
+  its list in the leaf order used by `_get_leaf_lists`. The returned function
+  only walks the value, appending each of its tensor-level constituents
+  directly to `leaf_lists[index]`. It holds no state of its own, so it is
+  cached and shared by all callers with the same type.
+
+  Args:
+    type_spec: A `computation_types.Type` as in
+      `make_empty_list_structure_for_element_type_spec`.
+
+  Returns:
+    A function that accepts the leaf lists and a value and appends the value.
+
+  Raises:
+    TypeError: If the `type_spec` is not of a form described above.
+  """
+  num_leaves = 0
+
+  def _compile(type_spec: computation_types.Type) -> _Appender:
+    nonlocal num_leaves
+    if isinstance(type_spec, computation_types.TensorType):
+      index = num_leaves
+      num_leaves += 1
+      dtype = type_spec.dtype
+
+      def _append_tensor(leaf_lists, value):
+        if value is None:
+          return
+        if isinstance(value, structure.Struct):
+          value = _struct_to_container(value)
+        # Convert the members to tensors to ensure that they are properly
+        # typed and grouped before being passed to
+        # tf.data.Dataset.from_tensor_slices.
+        leaf_lists[index].append(tf.convert_to_tensor(value, dtype))
+
+      return _append_tensor
+    elif not isinstance(type_spec, computation_types.StructType):
       raise TypeError(
-          'Expected an anonymous tuple to either have all elements named or '
-          'all unnamed, got {}.'.format(value)
+          'Expected a tensor or named tuple type, found {}.'.format(type_spec)
       )
-  if isinstance(type_spec, computation_types.TensorType):
-    if not isinstance(nested, list):
-      raise TypeError(f'Expected `nested` to be a `list`, found {type(nested)}')
-    # Convert the members to tensors to ensure that they are properly
-    # typed and grouped before being passed to
-    # tf.data.Dataset.from_tensor_slices.
-    nested.append(tf.convert_to_tensor(value, type_spec.dtype))  # pytype: disable=attribute-error
-  elif isinstance(type_spec, computation_types.StructType):
     elements = structure.to_elements(type_spec)
-    if isinstance(nested, collections.OrderedDict):
-      if isinstance(value, py_typecheck.SupportsNamedTuple):
-        # In Python 3.8 and later `_asdict` no longer return OrdereDict, rather
-        # a regular `dict`.
-        value = collections.OrderedDict(value._asdict())
-      if isinstance(value, dict):
-        if set(value.keys()) != set(k for k, _ in elements):
+    element_appenders = [(k, _compile(v)) for k, v in elements]
+    if all(k is not None for k, _ in elements):
+      element_names = frozenset(k for k, _ in elements)
+
+      def _append_named(leaf_lists, value):
+        if value is None:
+          return
+        if isinstance(value, structure.Struct):
+          value = _struct_to_container(value)
+        if isinstance(value, py_typecheck.SupportsNamedTuple):
+          value = value._asdict()
+        if isinstance(value, dict):
+          if value.keys() != element_names:
+            raise TypeError(
+                'Value {} does not match type {}.'.format(value, type_spec)
+            )
+          for k, append in element_appenders:
+            append(leaf_lists, value[k])
+        elif isinstance(value, (list, tuple)):
+          if len(value) != len(element_appenders):
+            raise TypeError(
+                'Value {} does not match type {}.'.format(value, type_spec)
+            )
+          for (_, append), v in zip(element_appenders, value):
+            append(leaf_lists, v)
+        else:
           raise TypeError(
-              'Value {} does not match type {}.'.format(value, type_spec)
-          )
-        for elem_name, elem_type in elements:
-          append_to_list_structure_for_element_type_spec(
-              nested[elem_name], value[elem_name], elem_type
+              'Unexpected type of value {} for TFF type {}.'.format(
+                  py_typecheck.type_string(type(value)), type_spec
+              )
           )
-      elif isinstance(value, (list, tuple)):
-        if len(value) != len(elements):
+
+      return _append_named
+    elif all(k is None for k, _ in elements):
+
+      def _append_unnamed(leaf_lists, value):
+        if value is None:
+          return
+        if isinstance(value, structure.Struct):
+          value = _struct_to_container(value)
+        py_typecheck.check_type(value, (list, tuple))
+        if len(value) != len(element_appenders):
           raise TypeError(
               'Value {} does not match type {}.'.format(value, type_spec)
           )
-        for idx, (elem_name, elem_type) in enumerate(elements):
-          append_to_list_structure_for_element_type_spec(
-              nested[elem_name], value[idx], elem_type
-          )
-      else:
-        raise TypeError(
-            'Unexpected type of value {} for TFF type {}.'.format(
-                py_typecheck.type_string(type(value)), type_spec
-            )
-        )
-    elif isinstance(nested, tuple):
-      py_typecheck.check_type(value, (list, tuple))
-      if len(value) != len(elements):
-        raise TypeError(
-            'Value {} does not match type {}.'.format(value, type_spec)
-        )
-      for idx, (_, elem_type) in enumerate(elements):
-        append_to_list_structure_for_element_type_spec(
-            nested[idx], value[idx], elem_type
+        for (_, append), v in zip(element_appenders, value):
+          append(leaf_lists, v)
+
+      return _append_unnamed
+    else:
+      raise TypeError(
+          'Expected a named tuple type with either all elements named or all '
+          'unnamed, got {}.'.format(type_spec)
+      )
+
+  return _compile(type_spec)
+
+
+_LeafListPacker = Callable[[list[list]], object]
+
+
+@functools.lru_cache()
+def _compile_leaf_list_packer(
+    type_spec: computation_types.Type,
+) -> tuple[int, _LeafListPacker]:
+  """Returns the number of leaves of `type_spec` and a function to nest them.
+
+  The returned function accepts the leaf lists of a value of `type_spec`, in
+  the leaf order used by `_compile_appender`. It nests them in the structure
+  that `make_empty_list_structure_for_element_type_spec` would create, with
+  any empty leaf lists replaced as by
+  `replace_empty_leaf_lists_with_numpy_arrays`. The type is walked once, here,
+  so that the function only builds the containers.
+
+  Args:
+    type_spec: A `computation_types.Type` as in
+      `make_empty_list_structure_for_element_type_spec`.
+
+  Returns:
+    A tuple of the number of leaves and the function that nests them.
+
+  Raises:
+    TypeError: If the `type_spec` is not of a form described above.
+  """
+  num_leaves = 0
+
+  def _compile(type_spec: computation_types.Type) -> _LeafListPacker:
+    nonlocal num_leaves
+    if isinstance(type_spec, computation_types.TensorType):
+      index = num_leaves
+      num_leaves += 1
+      dtype = type_spec.dtype
+
+      def _pack_tensor(leaf_lists):
+        leaf_list = leaf_lists[index]
+        if leaf_list:
+          return leaf_list
+        return np.array([], dtype=dtype)
+
+      return _pack_tensor
+    elif not isinstance(type_spec, computation_types.StructType):
+      raise TypeError(
+          'Expected a tensor or named tuple type, found {}.'.format(type_spec)
+      )
+    elements = structure.to_elements(type_spec)
+    element_packers = [(k, _compile(v)) for k, v in elements]
+    if all(k is not None for k, _ in elements):
+
+      def _pack_named(leaf_lists):
+        return collections.OrderedDict(
+            [(k, pack(leaf_lists)) for k, pack in element_packers]
         )
+
+      return _pack_named
+    elif all(k is None for k, _ in elements):
+
+      def _pack_unnamed(leaf_lists):
+        return tuple([pack(leaf_lists) for _, pack in element_packers])
+
+      return _pack_unnamed
     else:
       raise TypeError(
-          'Invalid nested structure, unexpected container type {}.'.format(
-              py_typecheck.type_string(type(nested))
-          )
+          'Expected a named tuple type with either all elements named or all '
+          'unnamed, got {}.'.format(type_spec)
       )
-  else:
-    raise TypeError(
-        'Expected a tensor or named tuple type, found {}.'.format(type_spec)
-    )
+
+  pack = _compile(type_spec)
+  return num_leaves, pack
 
 
 def replace_empty_leaf_lists_with_numpy_arrays(lists, type_spec):
@@ -833,6 +1181,13 @@ def replace_empty_leaf_lists_with_numpy_arrays(lists, type_spec):
   """
   type_spec = computation_types.tensorflow_to_type(type_spec)
   py_typecheck.check_type(type_spec, computation_types.Type)
+  return _replace_empty_leaf_lists_with_numpy_arrays(lists, type_spec)
+
+
+def _replace_empty_leaf_lists_with_numpy_arrays(
+    lists, type_spec: computation_types.Type
+):
+  """Implements `replace_empty_leaf_lists_with_numpy_arrays`."""
   if isinstance(type_spec, computation_types.TensorType):
     py_typecheck.check_type(lists, list)
     if lists:
@@ -844,7 +1199,7 @@ def replace_empty_leaf_lists_with_numpy_arrays(lists, type_spec):
     if isinstance(lists, collections.OrderedDict):
       to_return = []
       for elem_name, elem_type in elements:
-        elem_val = replace_empty_leaf_lists_with_numpy_arrays(
+        elem_val = _replace_empty_leaf_lists_with_numpy_arrays(
             lists[elem_name], elem_type
         )
         to_return.append((elem_name, elem_val))
@@ -852,7 +1207,7 @@ def replace_empty_leaf_lists_with_numpy_arrays(lists, type_spec):
     elif isinstance(lists, tuple):
       to_return = []
       for idx, (_, elem_type) in enumerate(elements):
-        elem_val = replace_empty_leaf_lists_with_numpy_arrays(
+        elem_val = _replace_empty_leaf_lists_with_numpy_arrays(
             lists[idx], elem_type
         )
         to_return.append(elem_val)
@@ -878,10 +1233,12 @@ def make_data_set_from_elements(graph, elements, element_type):
   with data set being composed of unequal batches. Typically, only the last
   batch is odd, so on the first attempt, we try to construct two data sets,
   one from all elements but the last one, and one from the last element, then
-  concatenate the two. In the unlikely case that this fails (e.g., because
-  all data set elements are batches of unequal sizes), we revert to the slow,
-  but reliable method of constructing data sets from singleton elements, and
-  then concatenating them all.
+  concatenate the two. In case this fails (e.g., because other data set
+  elements are batches of unequal sizes too), we split the elements into runs
+  of consecutive elements whose leaves have the same shapes, construct a data
+  set from each run (or from the singleton elements of a run, if that fails),
+  and concatenate them as a balanced tree, so that the result is O(log N)
+  rather than O(N) concatenations deep.
 
   Args:
     graph: The graph in which to construct the `tf.data.Dataset`, or `None` if
@@ -908,13 +1265,15 @@ def make_data_set_from_elements(graph, elements, element_type):
   py_typecheck.check_type(element_type, computation_types.Type)
 
   def _make(element_subset):
-    lists = make_empty_list_structure_for_element_type_spec(element_type)
+    # The (cached) compiled appender adds the leaves of each element directly
+    # to flat leaf lists, which are only nested into the structure expected by
+    # `from_tensor_slices` once all elements have been appended.
+    num_leaves, pack_leaf_lists = _compile_leaf_list_packer(element_type)
+    append_element = _compile_appender(element_type)
+    leaf_lists = [[] for _ in range(num_leaves)]
     for el in element_subset:
-      append_to_list_structure_for_element_type_spec(lists, el, element_type)
-    tensor_slices = replace_empty_leaf_lists_with_numpy_arrays(
-        lists, element_type
-    )
-    return tf.data.Dataset.from_tensor_slices(tensor_slices)
+      append_element(leaf_lists, el)
+    return tf.data.Dataset.from_tensor_slices(pack_leaf_lists(leaf_lists))
 
   def _work():
     if not elements:
@@ -931,17 +1290,22 @@ def make_data_set_from_elements(graph, elements, element_type):
         ds = _make(elements[0:-1]).concatenate(_make(elements[-1:]))
       except ValueError:
         # In case elements beyond just the last one are of unequal shapes, we
-        # may have failed (the most likely cause), so fall back onto the slow
-        # process of constructing and joining data sets from singletons. Not
-        # optimizing this for now, as it's very unlikely in scenarios
-        # we're targeting.
-        #
-        # Note: this will not remain `None` because `element`s is not empty.
-        ds = None
-        ds = typing.cast(tf.data.Dataset, ds)
-        for i in range(len(elements)):
-          singleton_ds = _make(elements[i : i + 1])
-          ds = singleton_ds if ds is None else ds.concatenate(singleton_ds)
+        # may have failed (the most likely cause), so fall back onto
+        # constructing data sets from the runs of consecutive elements whose
+        # leaves have the same shapes, and from singletons for any run that
+        # still fails. The data sets are concatenated as a balanced tree, so
+        # the result is O(log N) rather than O(N) concatenations deep.
+        def _make_run(run):
+          try:
+            return _make(run)
+          except ValueError:
+            if len(run) == 1:
+              raise
+            return _concatenate_balanced([_make([e]) for e in run])
+
+        ds = _concatenate_balanced(
+            [_make_run(run) for run in _split_into_shape_runs(elements)]
+        )
     ds_element_type = computation_types.tensorflow_to_type(ds.element_spec)
     if not element_type.is_assignable_from(ds_element_type):  # pytype: disable=attribute-error
       raise TypeError(
@@ -959,11 +1323,52 @@ def make_data_set_from_elements(graph, elements, element_type):
     return _work()
 
 
+def _shape_signature(element: object) -> object:
+  """Returns the shapes of the leaves of `element`, or `None` if unknown."""
+
+  def _shape(x):
+    shape = getattr(x, 'shape', None)
+    if shape is None:
+      shape = np.shape(x)
+    return tuple(shape)
+
+  try:
+    return tf.nest.map_structure(_shape, element)
+  except (TypeError, ValueError):
+    return None
+
+
+def _split_into_shape_runs(elements: list[object]) -> list[list[object]]:
+  """Splits `elements` into runs of consecutive elements of the same shapes."""
+  runs = []
+  previous_signature = None
+  for element in elements:
+    signature = _shape_signature(element)
+    if runs and signature is not None and signature == previous_signature:
+      runs[-1].append(element)
+    else:
+      runs.append([element])
+    previous_signature = signature
+  return runs
+
+
+def _concatenate_balanced(
+    datasets: list[tf.data.Dataset],
+) -> tf.data.Dataset:
+  """Concatenates the non-empty list `datasets` in order, as a balanced tree."""
+  if len(datasets) == 1:
+    return datasets[0]
+  mid = len(datasets) // 2
+  return _concatenate_balanced(datasets[:mid]).concatenate(
+      _concatenate_balanced(datasets[mid:])
+  )
+
+
 def fetch_value_in_session(sess, value):
   """Fetches `value` in `session`.
 
   Args:
-    sess: The session in which to perform the fetch (as a single run).
+    sess: The session in which to perform the fetch.
     value: A Python object of a form analogous to that constructed by the
       function `assemble_result_from_graph`, made of tensors and anononymous
       tuples, or a `tf.data.Dataset`.
@@ -971,7 +1376,9 @@ def fetch_value_in_session(sess, value):
   Returns:
     A Python object with structure similar to `value`, but with tensors
     replaced with their values, and data sets replaced with lists of their
-    elements, all fetched with a single call `session.run()`.
+    elements. The tensors are fetched with a single call `session.run()`. The
+    elements of each data set are fetched one per call, or a batch per call if
+    their shapes are fully defined.
 
   Raises:
     ValueError: If `value` is not a `tf.data.Dataset` or not a structure of
@@ -981,8 +1388,14 @@ def fetch_value_in_session(sess, value):
   # TODO: b/113123634 - Investigate handling `list`s and `tuple`s of
   # `tf.data.Dataset`s and what the API would look like to support this.
   if isinstance(value, tf.data.Dataset):
+    if _can_fetch_in_batches(value):
+      return _fetch_dataset_elements_in_batches(sess, value)
     with sess.graph.as_default():
-      iterator = tf.compat.v1.data.make_one_shot_iterator(value)
+      # Prefetching lets the runtime prepare the next element while the
+      # current one is being handed back to Python.
+      iterator = tf.compat.v1.data.make_one_shot_iterator(
+          value.prefetch(tf.data.AUTOTUNE)
+      )
       next_element = iterator.get_next()
     elements = []
     while True:
@@ -1029,14 +1442,84 @@ def fetch_value_in_session(sess, value):
     return structure.pack_sequence_as(value, flattened_results)
 
 
+# The maximum number of dataset elements fetched by a single `session.run()`
+# call, and the maximum number of bytes those elements may take up together.
+_FETCH_BATCH_SIZE = 1024
+_FETCH_BATCH_BYTES = 4 << 20
+
+
+def _can_fetch_in_batches(dataset: tf.data.Dataset) -> bool:
+  """Returns whether the elements of `dataset` can be batched for fetching.
+
+  Only elements made of (at least one) dense tensors with fully defined shapes
+  can be batched; elements of any other shape are fetched one at a time.
+
+  Args:
+    dataset: A `tf.data.Dataset`.
+  """
+  specs = tf.nest.flatten(dataset.element_spec)
+  return bool(specs) and all(
+      isinstance(spec, tf.TensorSpec) and spec.shape.is_fully_defined()
+      for spec in specs
+  )
+
+
+def _fetch_batch_size(element_spec) -> int:
+  """Returns how many elements of `element_spec` to fetch per session run.
+
+  The batch holds at most `_FETCH_BATCH_SIZE` elements, and at most
+  `_FETCH_BATCH_BYTES` bytes, but always at least one element. String leaves
+  are only counted by the size of a pointer, as their lengths are not known.
+
+  Args:
+    element_spec: The `element_spec` of a dataset for which
+      `_can_fetch_in_batches` is `True`.
+  """
+  element_bytes = sum(
+      spec.shape.num_elements() * spec.dtype.size
+      for spec in tf.nest.flatten(element_spec)
+  )
+  if element_bytes == 0:
+    return _FETCH_BATCH_SIZE
+  return max(1, min(_FETCH_BATCH_SIZE, _FETCH_BATCH_BYTES // element_bytes))
+
+
+def _fetch_dataset_elements_in_batches(sess, dataset):
+  """Fetches the elements of `dataset`, a batch per session run."""
+  batch_size = _fetch_batch_size(dataset.element_spec)
+  with sess.graph.as_default():
+    # The batches are not prefetched, so only the batch being fetched is held
+    # in memory in addition to the elements already handed back to Python.
+    iterator = tf.compat.v1.data.make_one_shot_iterator(
+        dataset.batch(batch_size)
+    )
+    next_batch = iterator.get_next()
+  elements = []
+  while True:
+    try:
+      batch = sess.run(next_batch)
+    except tf.errors.OutOfRangeError:
+      break
+    flat_batch = tf.nest.flatten(batch)
+    for i in range(len(flat_batch[0])):
+      # Rows of non-scalar leaves are copied, so that an element does not keep
+      # the whole batch alive or share memory with the other elements.
+      elements.append(
+          tf.nest.pack_sequence_as(
+              batch, [x[i].copy() if x.ndim > 1 else x[i] for x in flat_batch]
+          )
+      )
+  return elements
+
+
 def _interleave_dataset_results_and_tensors(dataset_results, flat_run_tensors):
-  flattened_results = []
-  for idx in range(len(dataset_results) + len(flat_run_tensors)):
-    if dataset_results.get(idx):
-      flattened_results.append(dataset_results[idx])
-    else:
-      flattened_results.append(flat_run_tensors.pop(0))
-  return flattened_results
+  # The tensors are consumed in order through an iterator, rather than popped
+  # from the front of the list, which would be quadratic in their number.
+  run_tensors = iter(flat_run_tensors)
+  return [
+      dataset_results[idx] if idx in dataset_results else next(run_tensors)
+      for idx in range(len(dataset_results) + len(flat_run_tensors))
+  ]
 
 
 def get_deps_for_graph_node(graph_def, node_name):
@@ -1121,6 +1604,16 @@ def coerce_dataset_elements_to_tff_type_spec(
     py_type = element_type.python_container
     if py_type is tf.RaggedTensor or py_type is tf.sparse.SparseTensor:
       return dataset
+  try:
+    dataset_element_type = computation_types.tensorflow_to_type(
+        dataset.element_spec
+    )
+  except TypeError:
+    dataset_element_type = None
+  # Note: `StructWithPythonType` equality also compares the Python containers,
+  # so the elements already have the required structure and need no `map()`.
+  if dataset_element_type == element_type:
+    return dataset
 
   # This is a similar to `reference_context.to_representation_for_type`,
   # look for opportunities to consolidate?
@@ -1199,6 +1692,7 @@ def uniquify_shared_names_with_suffix(
   # TODO: b/117428091 - Upgrade our TF serialization mechanisms in order to
   # unblock using more modern TF compositional constructs, and avoid direct
   # proto manipulation as is happening here.
+  encoded_suffix = b'_' + suffix.encode('utf-8')
   num_empty_shared_names = 0
   for node in graph_def.node:
     shared_name = node.attr.get('shared_name')
@@ -1208,7 +1702,7 @@ def uniquify_shared_names_with_suffix(
         # that starts with an underscore (not allowed by TF).
         shared_name.s = f'empty_{num_empty_shared_names}'.encode('utf-8')
         num_empty_shared_names += 1
-      shared_name.s += b'_' + suffix.encode('utf-8')
+      shared_name.s += encoded_suffix
   return graph_def
 
 
@@ -16,6 +16,7 @@ import collections
 import dataclasses
 
 from absl.testing import absltest
+from absl.testing import parameterized
 import attrs
 import numpy as np
 import tensorflow as tf
@@ -30,7 +31,7 @@ from tensorflow_federated.python.tensorflow_libs import serialization_utils
 from tensorflow_federated.python.tensorflow_libs import tensorflow_test_utils
 
 
-class GraphUtilsTest(tf.test.TestCase):
+class GraphUtilsTest(tf.test.TestCase, parameterized.TestCase):
 
   def _assert_binding_matches_type_and_value(
       self, binding, type_spec, val, graph, is_output
@@ -72,9 +73,15 @@ class GraphUtilsTest(tf.test.TestCase):
       if not isinstance(val, (list, tuple, structure.Struct)):
         self.assertIsInstance(val, dict)
         val = list(val.values())
-      for idx, e in enumerate(structure.to_elements(type_spec)):
+      element_bindings = binding.struct.element
+      elements = structure.to_elements(type_spec)
+      self.assertLen(element_bindings, len(elements))
+      self.assertLen(val, len(elements))
+      for element_binding, (_, element_type), element_val in zip(
+          element_bindings, elements, val
+      ):
         self._assert_binding_matches_type_and_value(
-            binding.struct.element[idx], e[1], val[idx], graph, is_output
+            element_binding, element_type, element_val, graph, is_output
         )
     else:
       self.fail('Unknown binding.')
@@ -217,73 +224,24 @@ class GraphUtilsTest(tf.test.TestCase):
           },
       )
 
-  def test_capture_result_with_string(self):
+  @parameterized.named_parameters(
+      ('str', 'a', 'str'),
+      ('int', 1, 'int32'),
+      ('float', 1.0, 'float32'),
+      ('bool', True, 'bool'),
+      ('np_int32', np.int32(1), 'int32'),
+      ('np_int64', np.int64(1), 'int64'),
+      ('np_float32', np.float32(1.0), 'float32'),
+      ('np_float64', np.float64(1.0), 'float64'),
+      ('np_bool', np.bool_(True), 'bool'),
+      ('np_ndarray', np.ndarray(shape=(2, 0), dtype=np.int32), 'int32[2,0]'),
+  )
+  def test_capture_result_with_constant(self, value, dtype):
     with tf.Graph().as_default() as graph:
       type_spec, binding = tensorflow_utils.capture_result_from_graph(
-          'a', graph
+          value, graph
       )
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'str')
-
-  def test_capture_result_with_int(self):
-    with tf.Graph().as_default() as graph:
-      type_spec, binding = tensorflow_utils.capture_result_from_graph(1, graph)
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'int32')
-
-  def test_capture_result_with_float(self):
-    with tf.Graph().as_default() as graph:
-      type_spec, binding = tensorflow_utils.capture_result_from_graph(
-          1.0, graph
-      )
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'float32')
-
-  def test_capture_result_with_bool(self):
-    with tf.Graph().as_default() as graph:
-      type_spec, binding = tensorflow_utils.capture_result_from_graph(
-          True, graph
-      )
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'bool')
-
-  def test_capture_result_with_np_int32(self):
-    with tf.Graph().as_default() as graph:
-      type_spec, binding = tensorflow_utils.capture_result_from_graph(
-          np.int32(1), graph
-      )
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'int32')
-
-  def test_capture_result_with_np_int64(self):
-    with tf.Graph().as_default() as graph:
-      type_spec, binding = tensorflow_utils.capture_result_from_graph(
-          np.int64(1), graph
-      )
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'int64')
-
-  def test_capture_result_with_np_float32(self):
-    with tf.Graph().as_default() as graph:
-      type_spec, binding = tensorflow_utils.capture_result_from_graph(
-          np.float32(1.0), graph
-      )
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'float32')
-
-  def test_capture_result_with_np_float64(self):
-    with tf.Graph().as_default() as graph:
-      type_spec, binding = tensorflow_utils.capture_result_from_graph(
-          np.float64(1.0), graph
-      )
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'float64')
-
-  def test_capture_result_with_np_bool(self):
-    with tf.Graph().as_default() as graph:
-      type_spec, binding = tensorflow_utils.capture_result_from_graph(
-          np.bool_(True), graph
-      )
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'bool')
-
-  def test_capture_result_with_np_ndarray(self):
-    with tf.Graph().as_default() as graph:
-      type_spec, binding = tensorflow_utils.capture_result_from_graph(
-          np.ndarray(shape=(2, 0), dtype=np.int32), graph
-      )
-    self._assert_captured_result_eq_dtype(type_spec, binding, 'int32[2,0]')
+    self._assert_captured_result_eq_dtype(type_spec, binding, dtype)
 
   def test_capture_result_with_ragged_tensor(self):
     with tf.Graph().as_default() as graph:
@@ -337,6 +295,25 @@ class GraphUtilsTest(tf.test.TestCase):
         'int32',
     )
 
+  @tensorflow_test_utils.graph_mode_test
+  def test_capture_result_with_int_placeholder_with_default(self):
+    self.assertEqual(
+        str(
+            self._checked_capture_result(
+                tf.compat.v1.placeholder_with_default(0, shape=[])
+            )
+        ),
+        'int32',
+    )
+
+  def test_capture_result_with_eager_tensor(self):
+    x = tf.constant(1)
+    with tf.Graph().as_default() as graph:
+      type_spec, binding = tensorflow_utils.capture_result_from_graph(x, graph)
+    self.assertEqual(str(type_spec), 'int32')
+    tensor = graph.get_tensor_by_name(binding.tensor.tensor_name)
+    self.assertEqual(tensor.op.type, 'Identity')
+
   @tensorflow_test_utils.graph_mode_test
   def test_capture_result_with_int_variable(self):
     # Verifies that the variable dtype is not being captured as `int32_ref`,
@@ -364,6 +341,18 @@ class GraphUtilsTest(tf.test.TestCase):
     self.assertEqual(str(t), '<int32,bool>')
     self.assertIs(t.python_container, tuple)
 
+  @tensorflow_test_utils.graph_mode_test
+  def test_capture_result_with_tuple_of_the_same_constant(self):
+    x = tf.constant(1)
+    graph = tf.compat.v1.get_default_graph()
+    type_spec, binding = tensorflow_utils.capture_result_from_graph(
+        (x, x), graph
+    )
+    self.assertEqual(str(type_spec), '<int32,int32>')
+    tensor_names = tensorflow_utils.extract_tensor_names_from_binding(binding)
+    self.assertLen(set(tensor_names), 2)
+    self.assertNotIn(x.name, tensor_names)
+
   @tensorflow_test_utils.graph_mode_test
   def test_capture_result_with_dict_of_constants(self):
     t1 = self._checked_capture_result({
@@ -516,7 +505,7 @@ class GraphUtilsTest(tf.test.TestCase):
         sequence=pb.TensorFlow.SequenceBinding(variant_tensor_name='bar')
     )
     result = tensorflow_utils.compute_map_from_bindings(source, target)
-    self.assertEqual(str(result), "OrderedDict([('foo', 'bar')])")
+    self.assertEqual(result, {'foo': 'bar'})
 
   def test_extract_tensor_names_from_binding_with_tuple_of_tensors(self):
     with tf.Graph().as_default() as graph:
@@ -535,7 +524,7 @@ class GraphUtilsTest(tf.test.TestCase):
         sequence=pb.TensorFlow.SequenceBinding(variant_tensor_name='foo')
     )
     result = tensorflow_utils.extract_tensor_names_from_binding(binding)
-    self.assertEqual(str(result), "['foo']")
+    self.assertEqual(result, ['foo'])
 
   @tensorflow_test_utils.graph_mode_test
   def test_assemble_result_from_graph_with_named_tuple(self):
@@ -631,7 +620,8 @@ class GraphUtilsTest(tf.test.TestCase):
     )
     elem = tensorflow_utils.make_whimsy_element_for_type_spec(type_spec)
     correct_elem = np.zeros([0, 10, 0, 10, 10], np.float32)
-    self.assertAllClose(elem, correct_elem)
+    self.assertAllEqual(elem, correct_elem)
+    self.assertEqual(elem.dtype, correct_elem.dtype)
 
   def test_make_whimsy_element_tensor_type_none_replaced_by_1(self):
     type_spec = computation_types.TensorType(
@@ -641,7 +631,8 @@ class GraphUtilsTest(tf.test.TestCase):
         type_spec, none_dim_replacement=1
     )
     correct_elem = np.zeros([1, 10, 1, 10, 10], np.float32)
-    self.assertAllClose(elem, correct_elem)
+    self.assertAllEqual(elem, correct_elem)
+    self.assertEqual(elem.dtype, correct_elem.dtype)
 
   def test_make_whimsy_element_struct_type(self):
     tensor1 = computation_types.TensorType(np.float32, [None, 10, None, 10, 10])
@@ -657,13 +648,27 @@ class GraphUtilsTest(tf.test.TestCase):
     ]
     self.assertEqual(len(elem), len(correct_list))
     for k, _ in enumerate(elem):
-      self.assertAllClose(elem[k], correct_list[k])
+      self.assertAllEqual(elem[k], correct_list[k])
     unnamed_elem = tensorflow_utils.make_whimsy_element_for_type_spec(
         unnamedtuple
     )
     self.assertEqual(len(unnamed_elem), len(correct_list))
     for k, _ in enumerate(unnamed_elem):
-      self.assertAllClose(unnamed_elem[k], correct_list[k])
+      self.assertAllEqual(unnamed_elem[k], correct_list[k])
+
+  def test_make_whimsy_element_struct_type_none_replaced_by_1(self):
+    tensor1 = computation_types.TensorType(np.float32, [None, 10, None, 10, 10])
+    tensor2 = computation_types.TensorType(np.int32, [10, None, 10])
+    struct_type = computation_types.StructType(
+        [('x', tensor1), ('y', computation_types.StructType([tensor2]))]
+    )
+    elem = tensorflow_utils.make_whimsy_element_for_type_spec(
+        struct_type, none_dim_replacement=1
+    )
+    self.assertLen(elem, 2)
+    self.assertAllEqual(elem[0], np.zeros([1, 10, 1, 10, 10], np.float32))
+    self.assertLen(elem[1], 1)
+    self.assertAllEqual(elem[1][0], np.zeros([10, 1, 10], np.int32))
 
   def test_nested_structures_equal(self):
     self.assertTrue(
@@ -711,9 +716,7 @@ class GraphUtilsTest(tf.test.TestCase):
         tf.compat.v1.get_default_graph(), [], tf.float32
     )
     self.assertIsInstance(ds, tf.data.Dataset)
-    self.assertEqual(
-        tf.compat.v1.Session().run(ds.reduce(1.0, lambda x, y: x + y)), 1.0
-    )
+    self.assertEqual(self.evaluate(ds.reduce(1.0, lambda x, y: x + y)), 1.0)
 
   @tensorflow_test_utils.graph_mode_test
   def test_make_data_set_from_elements_with_empty_list_definite_tensor(self):
@@ -726,9 +729,7 @@ class GraphUtilsTest(tf.test.TestCase):
     self.assertEqual(
         ds.element_spec, tf.TensorSpec(shape=(0, 10), dtype=tf.float32)
     )
-    self.assertEqual(
-        tf.compat.v1.Session().run(ds.reduce(1.0, lambda x, y: x + y)), 1.0
-    )
+    self.assertEqual(self.evaluate(ds.reduce(1.0, lambda x, y: x + y)), 1.0)
 
   @tensorflow_test_utils.graph_mode_test
   def test_make_data_set_from_elements_with_empty_list_definite_tuple(self):
@@ -755,44 +756,22 @@ class GraphUtilsTest(tf.test.TestCase):
         tf.compat.v1.get_default_graph(), [1, 2, 3, 4], tf.int32
     )
     self.assertIsInstance(ds, tf.data.Dataset)
-    self.assertEqual(
-        tf.compat.v1.Session().run(ds.reduce(0, lambda x, y: x + y)), 10
-    )
+    self.assertEqual(self.evaluate(ds.reduce(0, lambda x, y: x + y)), 10)
 
+  @parameterized.named_parameters(
+      ('dicts', dict),
+      ('ordered_dicts', collections.OrderedDict),
+  )
   @tensorflow_test_utils.graph_mode_test
-  def test_make_data_set_from_elements_with_list_of_dicts(self):
+  def test_make_data_set_from_elements_with_list_of_mappings(self, container):
     ds = tensorflow_utils.make_data_set_from_elements(
         tf.compat.v1.get_default_graph(),
         [
-            {
-                'a': 1,
-                'b': 2,
-            },
-            {
-                'a': 3,
-                'b': 4,
-            },
-        ],
-        [('a', tf.int32), ('b', tf.int32)],
-    )
-    self.assertIsInstance(ds, tf.data.Dataset)
-    self.assertEqual(
-        tf.compat.v1.Session().run(
-            ds.reduce(0, lambda x, y: x + y['a'] + y['b'])
-        ),
-        10,
-    )
-
-  @tensorflow_test_utils.graph_mode_test
-  def test_make_data_set_from_elements_with_list_of_ordered_dicts(self):
-    ds = tensorflow_utils.make_data_set_from_elements(
-        tf.compat.v1.get_default_graph(),
-        [
-            collections.OrderedDict([
+            container([
                 ('a', 1),
                 ('b', 2),
             ]),
-            collections.OrderedDict([
+            container([
                 ('a', 3),
                 ('b', 4),
             ]),
@@ -801,9 +780,7 @@ class GraphUtilsTest(tf.test.TestCase):
     )
     self.assertIsInstance(ds, tf.data.Dataset)
     self.assertEqual(
-        tf.compat.v1.Session().run(
-            ds.reduce(0, lambda x, y: x + y['a'] + y['b'])
-        ),
+        self.evaluate(ds.reduce(0, lambda x, y: x + y['a'] + y['b'])),
         10,
     )
 
@@ -819,9 +796,7 @@ class GraphUtilsTest(tf.test.TestCase):
     )
     self.assertIsInstance(ds, tf.data.Dataset)
     self.assertEqual(
-        tf.compat.v1.Session().run(
-            ds.reduce(0, lambda x, y: x + tf.reduce_sum(y))
-        ),
+        self.evaluate(ds.reduce(0, lambda x, y: x + tf.reduce_sum(y))),
         10,
     )
 
@@ -843,9 +818,7 @@ class GraphUtilsTest(tf.test.TestCase):
     )
     self.assertIsInstance(ds, tf.data.Dataset)
     self.assertEqual(
-        tf.compat.v1.Session().run(
-            ds.reduce(0, lambda x, y: x + y['a'] + y['b'])
-        ),
+        self.evaluate(ds.reduce(0, lambda x, y: x + y['a'] + y['b'])),
         10,
     )
 
@@ -871,7 +844,7 @@ class GraphUtilsTest(tf.test.TestCase):
     def reduce_fn(x, y):
       return x + tf.reduce_sum(y['a']) + tf.reduce_sum(y['b'])
 
-    self.assertEqual(tf.compat.v1.Session().run(ds.reduce(0, reduce_fn)), 10)
+    self.assertEqual(self.evaluate(ds.reduce(0, reduce_fn)), 10)
 
   @tensorflow_test_utils.graph_mode_test
   def test_make_data_set_from_elements_with_list_of_dicts_with_tensors(self):
@@ -895,7 +868,7 @@ class GraphUtilsTest(tf.test.TestCase):
     def reduce_fn(x, y):
       return x + tf.reduce_sum(y['a']) + tf.reduce_sum(y['b'])
 
-    self.assertEqual(tf.compat.v1.Session().run(ds.reduce(0, reduce_fn)), 10)
+    self.assertEqual(self.evaluate(ds.reduce(0, reduce_fn)), 10)
 
   @tensorflow_test_utils.graph_mode_test
   def test_make_data_set_from_elements_with_list_of_dicts_with_np_array(self):
@@ -918,14 +891,14 @@ class GraphUtilsTest(tf.test.TestCase):
     def reduce_fn(x, y):
       return x + tf.reduce_sum(y['a']) + tf.reduce_sum(y['b'])
 
-    self.assertEqual(tf.compat.v1.Session().run(ds.reduce(0, reduce_fn)), 10)
+    self.assertEqual(self.evaluate(ds.reduce(0, reduce_fn)), 10)
 
   @tensorflow_test_utils.graph_mode_test
   def test_fetch_value_in_session_with_string(self):
     x = tf.constant('abc')
     with tf.compat.v1.Session() as sess:
       y = tensorflow_utils.fetch_value_in_session(sess, x)
-    self.assertEqual(str(y), 'abc')
+    self.assertEqual(y, 'abc')
 
   @tensorflow_test_utils.graph_mode_test
   def test_fetch_value_in_session_without_data_sets(self):
@@ -943,7 +916,9 @@ class GraphUtilsTest(tf.test.TestCase):
     )
     with tf.compat.v1.Session() as sess:
       y = tensorflow_utils.fetch_value_in_session(sess, x)
-    self.assertEqual(str(y), '<a=<b=10>>')
+    self.assertEqual(
+        y, structure.Struct([('a', structure.Struct([('b', 10)]))])
+    )
 
   @tensorflow_test_utils.graph_mode_test
   def test_fetch_value_in_session_with_empty_structure(self):
@@ -961,7 +936,12 @@ class GraphUtilsTest(tf.test.TestCase):
     )
     with tf.compat.v1.Session() as sess:
       y = tensorflow_utils.fetch_value_in_session(sess, x)
-    self.assertEqual(str(y), '<a=<b=<>>>')
+    self.assertEqual(
+        y,
+        structure.Struct(
+            [('a', structure.Struct([('b', structure.Struct([]))]))]
+        ),
+    )
 
   @tensorflow_test_utils.graph_mode_test
   def test_fetch_value_in_session_with_partially_empty_structure(self):
@@ -978,7 +958,47 @@ class GraphUtilsTest(tf.test.TestCase):
     )
     with tf.compat.v1.Session() as sess:
       y = tensorflow_utils.fetch_value_in_session(sess, x)
-    self.assertEqual(str(y), '<a=<b=<>,c=10>>')
+    self.assertEqual(
+        y,
+        structure.Struct([
+            (
+                'a',
+                structure.Struct([('b', structure.Struct([])), ('c', 10)]),
+            ),
+        ]),
+    )
+
+  @tensorflow_test_utils.graph_mode_test
+  def test_fetch_value_in_session_with_data_set_of_fixed_shape_elements(self):
+    ds = tf.data.Dataset.range(5).map(lambda x: {'a': x, 'b': [x, x + 1]})
+    with tf.compat.v1.Session() as sess:
+      y = tensorflow_utils.fetch_value_in_session(sess, ds)
+    self.assertLen(y, 5)
+    for i, element in enumerate(y):
+      self.assertEqual(element['a'], i)
+      self.assertAllEqual(element['b'], [i, i + 1])
+      # Elements must not be views into the fetched batch.
+      self.assertIsNone(element['b'].base)
+
+  @tensorflow_test_utils.graph_mode_test
+  def test_fetch_value_in_session_with_data_set_of_large_elements(self):
+    # Each element takes up 8 MiB, more than a single fetched batch may hold.
+    ds = tf.data.Dataset.range(3).map(lambda x: tf.fill([1 << 20], x))
+    with tf.compat.v1.Session() as sess:
+      y = tensorflow_utils.fetch_value_in_session(sess, ds)
+    self.assertLen(y, 3)
+    for i, element in enumerate(y):
+      self.assertEqual(element.shape, (1 << 20,))
+      self.assertTrue(np.all(element == i))
+
+  @tensorflow_test_utils.graph_mode_test
+  def test_fetch_value_in_session_with_data_set_of_varying_shape_elements(self):
+    ds = tf.data.Dataset.range(1, 4).map(tf.range)
+    with tf.compat.v1.Session() as sess:
+      y = tensorflow_utils.fetch_value_in_session(sess, ds)
+    self.assertLen(y, 3)
+    for i, element in enumerate(y):
+      self.assertAllEqual(element, list(range(i + 1)))
 
   def test_make_empty_list_structure_for_element_type_spec_w_tuple_dict(self):
     type_spec = [tf.int32, [('a', tf.bool), ('b', tf.float32)]]
@@ -1206,6 +1226,22 @@ class GraphUtilsTest(tf.test.TestCase):
         [('x', computation_types.TensorType(np.int32, (None,)))],
     )
 
+  def test_make_data_set_from_elements_with_runs_of_equal_batches(self):
+    ds = tensorflow_utils.make_data_set_from_elements(
+        None,
+        [
+            np.array([1, 2]),
+            np.array([3, 4]),
+            np.array([5]),
+            np.array([6]),
+            np.array([7, 8]),
+        ],
+        computation_types.TensorType(np.int32, (None,)),
+    )
+    self.assertEqual(
+        [x.numpy().tolist() for x in ds], [[1, 2], [3, 4], [5], [6], [7, 8]]
+    )
+
   def test_make_data_set_from_elements_with_just_one_batch(self):
     tensorflow_utils.make_data_set_from_elements(
         tf.compat.v1.get_default_graph(),
@@ -1328,6 +1364,18 @@ class GraphUtilsTest(tf.test.TestCase):
     )
     self.assertEqual(x.element_spec, y.element_spec)
 
+  def test_coerce_dataset_elements_with_matching_structure_noop(self):
+    dataset = tf.data.Dataset.range(5).map(
+        lambda x: collections.OrderedDict([('b', x), ('a', x)])
+    )
+    element_type = computation_types.StructWithPythonType(
+        [('b', np.int64), ('a', np.int64)], collections.OrderedDict
+    )
+    result = tensorflow_utils.coerce_dataset_elements_to_tff_type_spec(
+        dataset, element_type
+    )
+    self.assertIs(result, dataset)
+
   def test_coerce_ragged_tensor_dataset_elements_noop(self):
     ragged_tensor = tf.RaggedTensor.from_row_splits(
         values=[3, 1, 4], row_splits=[0, 2, 2, 3]